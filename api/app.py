@@ -2,14 +2,48 @@
 API permettant d'utiliser WPGarlic.
 """
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
+from metrics import MetricsMiddleware
 from routers import api_status, fuzz_plugin, wordpress
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """
+    Démarre les clients et jobs en background au démarrage de l'API, et les arrête à sa fermeture.
+    """
+    await api_status.startup()
+    await wordpress.startup()
+    await fuzz_plugin.startup()
+    yield
+    await api_status.shutdown()
+    await wordpress.shutdown()
+    await fuzz_plugin.shutdown()
+
+
 # Create FastAPI
-app = FastAPI(debug=True, title="Projet Fuzzer - WPGarlic API", redoc_url=None)
+app = FastAPI(debug=True, title="Projet Fuzzer - WPGarlic API", redoc_url=None, lifespan=lifespan)
 
 # Register routers
 app.include_router(api_status.router)
 app.include_router(fuzz_plugin.router)
 app.include_router(wordpress.router)
+
+app.add_middleware(MetricsMiddleware, routers={
+    api_status.router.prefix: 'api_status',
+    fuzz_plugin.router.prefix: 'fuzz_plugin',
+    wordpress.router.prefix: 'wordpress'
+})
+
+
+@app.get('/metrics', include_in_schema=False)
+def get_metrics():
+    """
+    Expose les métriques de l'API au format Prometheus.
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,349 @@
+"""
+Benchmark : print_findings.py
+
+Mesure le débit (MB/s), la mémoire résidente maximale (RSS) et les allocations (tracemalloc) de
+FindingsPrinter.print_findings et de print_findings_from_folder, sur des résultats de fuzzer synthétiques
+(forme "command_results"), de quelques KB à des centaines de MB, riches ou pauvres en trouvailles.
+
+Chaque mesure est exécutée dans un processus séparé, afin que le RSS maximal lui soit propre.
+Les résultats sont enregistrés en JSON, et peuvent être comparés à ceux d'un autre commit (--compare).
+
+Exemple, depuis le dossier api/ (wpgarlic fournit crash_detector, filtering et fuzzer_output_regexes) :
+    python benchmarks/bench_print_findings.py --wpgarlic ./wpgarlic --findings ./replacements --sizes 64KB,16MB
+"""
+
+import argparse
+import importlib
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import List, Optional
+
+UNITS = {'KB': 1 << 10, 'MB': 1 << 20, 'GB': 1 << 30}
+DEFAULT_SIZES = '16KB,1MB,32MB,256MB'
+COMMAND_SIZE = 256 << 10  # Taille de la sortie d'une commande (fichier/action fuzzé)
+FILE_SIZE = 8 << 20  # Taille maximale d'un fichier de résultats, pour print_findings_from_folder
+
+# Intervalle moyen (en caractères) entre deux trouvailles
+DENSITIES = {
+    'dense': 1 << 10,
+    'sparse': 1 << 20,
+}
+
+FILLER_WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', '<div class="wrap">', '</div>', '<br />', 'wp-content',
+                'admin-ajax.php', 'nonce', '&nbsp;', '\n')
+FINDINGS = (
+    'Warning: mysqli_query() expects parameter 1 to be mysqli in /var/www/html/wp-content/plugins/p/p.php on line 12',
+    'Fatal error: Uncaught Error: Call to undefined function foo() in /var/www/html/wp-content/plugins/p/p.php',
+    'Notice: Undefined index: id in /var/www/html/wp-content/plugins/p/p.php on line 3',
+    '__GARLIC_INTERCEPT__{"name":"_GET","key":"id","payload":"1\' OR 1=1"}__ENDGARLIC__',
+    '__GARLIC_COULD_AS_WELL_BE_EQUAL__6162,6364__ENDGARLIC__',
+    '__GARLIC_CALL__{"what":"unlink","data":{"name":"file","value":"../../wp-config.php"}}__ENDGARLIC__',
+    '__GARLIC_HEADER__4c6f636174696f6e3a2068747470733a2f2f6578616d706c652e636f6d__ENDGARLIC__',
+    '__GARLIC_NOT_IMPLEMENTED__wp_remote_get__ENDGARLIC__',
+)
+OBJECT_NAMES = ('/var/www/html/wp-content/plugins/p/p.php', 'ajax:p_action', 'menu:p_settings', 'ADMIN OUTPUT')
+
+
+def parse_size(value: str) -> int:
+    """
+    Convertit une taille (ex. "16KB", "256MB") en octets.
+    """
+    value = value.strip().upper()
+    for unit, factor in UNITS.items():
+        if value.endswith(unit):
+            return int(float(value[:-len(unit)]) * factor)
+    return int(value)
+
+
+def format_size(size: int) -> str:
+    """
+    Convertit une taille en octets en texte (ex. "16MB").
+    """
+    for unit, factor in reversed(UNITS.items()):
+        if size >= factor and size % factor == 0:
+            return f'{size // factor}{unit}'
+    return str(size)
+
+
+def format_throughput(mb_per_s: Optional[float]) -> str:
+    """
+    Convertit un débit en texte aligné, "n/a" si la durée mesurée était nulle.
+    """
+    return f'{mb_per_s:>9.2f}' if mb_per_s is not None else f'{"n/a":>9}'
+
+
+def generate_output(size: int, density: str, rng: random.Random) -> str:
+    """
+    Génère une sortie de commande synthétique d'environ size caractères.
+    :param density: Clé de DENSITIES, intervalle moyen entre deux trouvailles
+    """
+    interval = DENSITIES[density]
+    parts = []
+    length = 0
+    next_finding = rng.expovariate(1 / interval)
+    while length < size:
+        if length >= next_finding:
+            part = rng.choice(FINDINGS)
+            next_finding = length + rng.expovariate(1 / interval)
+        else:
+            part = rng.choice(FILLER_WORDS) + ' '
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)
+
+
+def generate_commands(size: int, density: str, rng: random.Random):
+    """
+    Génère des commandes ("command_results") dont les sorties totalisent environ size caractères.
+    """
+    remaining = size
+    while remaining > 0:
+        command_size = min(COMMAND_SIZE, remaining)
+        remaining -= command_size
+        yield {
+            'object_name': rng.choice(OBJECT_NAMES),
+            'output': generate_output(command_size // 2, density, rng),
+            'stdout': generate_output(command_size - command_size // 2, density, rng),
+            'stderr': '',
+        }
+
+
+def generate_result_file(path: str, size: int, density: str, rng: random.Random):
+    """
+    Écrit un fichier de résultats du fuzzer, une commande à la fois afin de borner la mémoire utilisée.
+    """
+    with open(path, 'w', encoding='utf-8') as result_file:
+        result_file.write('{"active_installs": %d, "command_results": [' % rng.randint(0, 1000000))
+        for i, command in enumerate(generate_commands(size, density, rng)):
+            if i:
+                result_file.write(', ')
+            json.dump(command, result_file)
+        result_file.write(']}')
+
+
+def generate_folder(folder: str, size: int, density: str, seed: int):
+    """
+    Génère un dossier de fichiers de résultats totalisant environ size octets.
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    count = max(1, math.ceil(size / FILE_SIZE))
+    for i in range(count):
+        path = os.path.join(folder, f'result_{i:04d}.json')
+        generate_result_file(path, min(FILE_SIZE, size - i * FILE_SIZE), density, rng)
+        os.utime(path, (1_000_000 + i, 1_000_000 + i))
+
+
+def folder_size(folder: str) -> int:
+    """
+    Obtient la taille totale des fichiers JSON d'un dossier.
+    """
+    return sum(entry.stat().st_size for entry in os.scandir(folder) if entry.name.endswith('.json'))
+
+
+def bench_printer(spec: dict) -> dict:
+    """
+    Mesure FindingsPrinter.print_findings sur des sorties de commandes en mémoire.
+    """
+    print_findings = importlib.import_module('print_findings')
+    rng = random.Random(spec['seed'])
+    outputs = [(command['object_name'], print_findings.command_output(command))
+               for command in generate_commands(spec['size'], spec['density'], rng)]
+    total = sum(len(output) for _, output in outputs)
+
+    if spec['tracemalloc']:
+        tracemalloc.start()
+    output_text = print_findings.new_output_text()
+    printer = print_findings.FindingsPrinter(output_text)
+    started = time.perf_counter()
+    for object_name, output in outputs:
+        printer.print_findings(output, 'result.json', 1000, object_name, with_color=False)
+    elapsed = time.perf_counter() - started
+    result = {'bytes': total, 'seconds': elapsed, 'findings': len(output_text['data'])}
+    if spec['tracemalloc']:
+        result['tracemalloc_peak'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def bench_folder(spec: dict) -> dict:
+    """
+    Mesure print_findings_from_folder sur une copie (liens physiques) du dossier généré.
+    """
+    print_findings = importlib.import_module('print_findings')
+    workdir = tempfile.mkdtemp(prefix='bench_print_findings_')
+    try:
+        folder = os.path.join(workdir, 'data', 'plugin_fuzz_results')
+        os.makedirs(folder)
+        for entry in os.scandir(spec['folder']):
+            os.link(entry.path, os.path.join(folder, entry.name))
+        os.chdir(workdir)
+
+        if spec['tracemalloc']:
+            tracemalloc.start()
+        started = time.perf_counter()
+        print_findings.print_findings_from_folder(folder, min_active_installs=0, show_only_paths_containing=None,
+                                                  jobs=spec['jobs'], archive_level=6, archive_bundle=None,
+                                                  follow=False, stop_file='', poll_interval=0, timings_file=None)
+        elapsed = time.perf_counter() - started
+        result = {'bytes': folder_size(spec['folder']), 'seconds': elapsed}
+        if spec['tracemalloc']:
+            result['tracemalloc_peak'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        with open(os.path.join(workdir, 'data', 'output.json'), 'r', encoding='utf-8') as output_file:
+            result['findings'] = len(json.load(output_file)['data'])
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+BENCHMARKS = {
+    'print_findings': bench_printer,
+    'print_findings_from_folder': bench_folder,
+}
+
+
+def run_worker(spec: dict) -> dict:
+    """
+    Exécute une mesure dans un processus séparé.
+    :return: Le résultat de la mesure, et le RSS maximal du processus (KB)
+    """
+    with subprocess.Popen([sys.executable, __file__, '--worker', json.dumps(spec)], stdout=subprocess.PIPE) as worker:
+        output = worker.stdout.read()
+        _, status, rusage = os.wait4(worker.pid, 0)
+        worker.returncode = os.waitstatus_to_exitcode(status)
+    if worker.returncode != 0:
+        raise RuntimeError(f'Benchmark worker failed: {spec}')
+    return {**json.loads(output), 'peak_rss_kb': rusage.ru_maxrss}
+
+
+def git_commit() -> Optional[str]:
+    """
+    Obtient le commit courant, si disponible.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[dict], baseline_path: str):
+    """
+    Affiche le débit relatif à des résultats précédents (ex. ceux d'un autre commit).
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as baseline_file:
+        baseline = {(result['benchmark'], result['size'], result['density']): result
+                    for result in json.load(baseline_file)['results']}
+    for result in results:
+        previous = baseline.get((result['benchmark'], result['size'], result['density']))
+        if previous is None:
+            continue
+        if previous['mb_per_s'] and result['mb_per_s'] is not None:
+            change = f"{result['mb_per_s'] / previous['mb_per_s'] - 1:+.1%}"
+        else:
+            change = 'n/a'
+        print(f"{result['benchmark']:<28} {format_size(result['size']):>6} {result['density']:<7} "
+              f"{format_throughput(previous['mb_per_s'])} -> {format_throughput(result['mb_per_s'])} MB/s "
+              f"({change}), RSS {previous['peak_rss_kb']} -> {result['peak_rss_kb']} KB")
+
+
+def run_benchmarks(args: argparse.Namespace, path: List[str]) -> List[dict]:
+    """
+    Exécute chaque benchmark pour chaque taille et densité, sur des données générées une seule fois.
+    :param path: Dossiers à ajouter au sys.path des processus de mesure
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix='bench_print_findings_data_') as data_dir:
+        for size in map(parse_size, args.sizes.split(',')):
+            for density in args.densities.split(','):
+                folder = os.path.join(data_dir, f'{size}_{density}')
+                for benchmark in args.benchmarks.split(','):
+                    if benchmark == 'print_findings_from_folder' and not os.path.isdir(folder):
+                        generate_folder(folder, size, density, args.seed)
+                    spec = {'benchmark': benchmark, 'size': size, 'density': density, 'seed': args.seed,
+                            'folder': folder, 'jobs': args.jobs, 'tracemalloc': False, 'path': path}
+                    runs = [run_worker(spec) for _ in range(args.repeat)]
+                    best = min(runs, key=lambda run: run['seconds'])
+                    result = {
+                        'benchmark': benchmark,
+                        'size': size,
+                        'density': density,
+                        'bytes': best['bytes'],
+                        'findings': best['findings'],
+                        'seconds': best['seconds'],
+                        'mb_per_s': best['bytes'] / (1 << 20) / best['seconds'] if best['seconds'] else None,
+                        'peak_rss_kb': max(run['peak_rss_kb'] for run in runs),
+                    }
+                    if not args.no_tracemalloc:
+                        result['tracemalloc_peak'] = run_worker({**spec, 'tracemalloc': True})['tracemalloc_peak']
+                    results.append(result)
+                    print(f"{benchmark:<28} {format_size(size):>6} {density:<7} "
+                          f"{format_throughput(result['mb_per_s'])} MB/s "
+                          f"{result['peak_rss_kb']:>9} KB RSS {result['findings']:>8} findings", file=sys.stderr)
+                shutil.rmtree(folder, ignore_errors=True)
+
+    return results
+
+
+def main():
+    """
+    Exécute les benchmarks et enregistre les résultats.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark of the findings pipeline (print_findings.py).')
+    parser.add_argument('--wpgarlic', default='./wpgarlic',
+                        help='wpgarlic folder (crash_detector, filtering, fuzzer_output_regexes)')
+    parser.add_argument('--findings', default=None,
+                        help='Folder of print_findings.py, result_reader.py and archiving.py (default: --wpgarlic)')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'Comma-separated sizes (default: {DEFAULT_SIZES})')
+    parser.add_argument('--densities', default=','.join(DENSITIES), help='Comma-separated finding densities')
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS), help='Comma-separated benchmarks')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measure, the fastest is kept')
+    parser.add_argument('--jobs', type=int, default=1, help='--jobs of print_findings_from_folder')
+    parser.add_argument('--no-tracemalloc', action='store_true', help='Skip the allocation measures (slow)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=None, help='Results file (default: bench_print_findings-<commit>.json)')
+    parser.add_argument('--compare', default=None, help='Previous results file to compare with')
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        spec = json.loads(args.worker)
+        sys.path[:0] = spec['path']
+        print(json.dumps(BENCHMARKS[spec['benchmark']](spec)))
+        return
+    path = [os.path.abspath(args.findings or args.wpgarlic), os.path.abspath(args.wpgarlic)]
+
+    commit = git_commit()
+    results = run_benchmarks(args, path)
+
+    output_path = args.output or f'bench_print_findings-{(commit or "unknown")[:12]}.json'
+    with open(output_path, 'w', encoding='utf-8') as output_file:
+        json.dump({
+            'commit': commit,
+            'date': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'jobs': args.jobs,
+            'repeat': args.repeat,
+            'results': results,
+        }, output_file, indent=4)
+    print(f'Results written to {output_path}', file=sys.stderr)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Client : Cache des réponses HTTP
+"""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import httpx
+
+CACHEABLE_STATUS_CODES = (200, 404)
+
+
+@dataclass
+class CachedResponse:
+    """
+    Réponse conservée en cache. Offre la même interface que httpx.Response pour les routers
+    (status_code, text, json()).
+    """
+    status_code: int
+    text: str
+    expires_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def json(self):
+        """
+        Décode le contenu JSON de la réponse.
+        """
+        return json.loads(self.text)
+
+
+class ResponseCache:  # pylint: disable=too-many-instance-attributes
+    """
+    Cache des réponses d'une API, utilisable à la place d'un httpx.AsyncClient (méthode get).
+    - TTL par endpoint (selon le paramètre "action" de la requête);
+    - revalidation conditionnelle (ETag / Last-Modified) des entrées expirées;
+    - mémoire bornée (LRU, en nombre d'octets);
+    - coalescence : N appels identiques simultanés ne causent qu'une seule requête vers l'upstream.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, ttls: Dict[str, float], default_ttl: float = 300,
+                 max_bytes: int = 64 * 1024 * 1024):
+        """
+        Initialiser le cache.
+        :param client: Client HTTP utilisé pour les requêtes vers l'upstream
+        :param ttls: Durée de vie (secondes) des réponses, par valeur du paramètre "action"
+        :param default_ttl: Durée de vie des réponses des autres requêtes
+        :param max_bytes: Taille maximale du contenu conservé en cache
+        """
+        self.client = client
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[tuple, CachedResponse]' = OrderedDict()
+        self._size = 0
+        # Requêtes en cours vers l'upstream, partagées par tous les appels identiques simultanés
+        self._in_flight: Dict[tuple, asyncio.Future] = {}
+        self.counters = {'hits': 0, 'misses': 0, 'revalidations': 0, 'coalesced': 0, 'evictions': 0}
+
+    def stats(self) -> dict:
+        """
+        Obtient les compteurs du cache.
+        """
+        return {**self.counters, 'entries': len(self._entries), 'bytes': self._size}
+
+    async def get(self, url: str, params: Optional[dict] = None, timeout: Optional[float] = None) -> CachedResponse:
+        """
+        Obtient une réponse, depuis le cache si elle est encore valide.
+        :param url: URL de l'upstream
+        :param params: Paramètres de la requête
+        :param timeout: Timeout de la requête vers l'upstream
+        """
+        params = params or {}
+        key = (url, tuple(sorted((name, str(value)) for name, value in params.items())))
+        cached = self._entries.get(key)
+        if cached is not None and cached.expires_at > time.monotonic():
+            self._entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return cached
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.counters['coalesced'] += 1
+            # shield() : l'annulation d'un appel en attente ne doit pas annuler la requête partagée
+            return await asyncio.shield(in_flight)
+
+        self.counters['misses'] += 1
+        in_flight = self._in_flight[key] = asyncio.ensure_future(self._fetch(key, url, params, timeout, cached))
+        return await asyncio.shield(in_flight)
+
+    # pylint: disable=too-many-arguments
+    async def _fetch(self, key: tuple, url: str, params: dict, timeout: Optional[float],
+                     stale: Optional[CachedResponse]) -> CachedResponse:
+        """
+        Obtient la réponse de l'upstream, en revalidant l'entrée expirée si possible.
+        """
+        headers = {}
+        if stale is not None and stale.etag:
+            headers['If-None-Match'] = stale.etag
+        if stale is not None and stale.last_modified:
+            headers['If-Modified-Since'] = stale.last_modified
+
+        try:
+            response = await self.client.get(url, params=params, headers=headers,
+                                             timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT)
+        finally:
+            del self._in_flight[key]  # Les appels suivants ne seront plus coalescés avec celui-ci
+
+        expires_at = time.monotonic() + self.ttls.get(params.get('action'), self.default_ttl)
+        if response.status_code == 304 and stale is not None:
+            stale.expires_at = expires_at
+            self.counters['revalidations'] += 1
+            return stale
+
+        cached = CachedResponse(status_code=response.status_code, text=response.text, expires_at=expires_at,
+                                etag=response.headers.get('ETag'),
+                                last_modified=response.headers.get('Last-Modified'))
+        if response.status_code in CACHEABLE_STATUS_CODES:
+            self._store(key, cached)
+        return cached
+
+    def _store(self, key: tuple, cached: CachedResponse):
+        """
+        Ajoute une réponse au cache, en retirant les entrées les moins récemment utilisées au besoin.
+        """
+        size = len(cached.text)
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous.text)
+        self._entries[key] = cached
+        self._size += size
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted.text)
+            self.counters['evictions'] += 1
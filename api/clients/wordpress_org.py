@@ -0,0 +1,66 @@
+"""
+Client : API de wordpress.org
+"""
+
+import os
+import time
+
+import httpx
+
+from metrics import OUTBOUND_DURATION, OUTBOUND_ERRORS, WORDPRESS_ACTIONS, status_class
+
+# Configurable afin de pouvoir pointer vers un serveur local (ex. un stub pour les tests)
+BASE_URL = os.environ.get('WORDPRESS_API_URL', 'https://api.wordpress.org/plugins/info/1.2/')
+PER_PAGE = 250  # Maximum accepté par wordpress.org
+TIMEOUT = 30
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """
+    Transport HTTP mesurant la latence et les erreurs des requêtes vers wordpress.org (voir metrics).
+    """
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        action = request.url.params.get('action')
+        if action not in WORDPRESS_ACTIONS:
+            action = 'other'
+        started = time.perf_counter()
+        try:
+            response = await super().handle_async_request(request)
+        except httpx.TransportError as ex:
+            OUTBOUND_ERRORS.labels(action, type(ex).__name__).inc()
+            OUTBOUND_DURATION.labels(action, 'error').observe(time.perf_counter() - started)
+            raise
+        OUTBOUND_DURATION.labels(action, status_class(response.status_code)).observe(time.perf_counter() - started)
+        if response.status_code >= 500 or response.status_code == 429:
+            OUTBOUND_ERRORS.labels(action, f'http_{response.status_code}').inc()
+        return response
+
+
+def create_client(max_connections: int = 100) -> httpx.AsyncClient:
+    """
+    Crée un client HTTP asynchrone partagé vers wordpress.org : les connexions sont conservées (keep-alive)
+    et multiplexées via HTTP/2 lorsque le serveur le supporte.
+    :param max_connections: Nombre maximal de connexions simultanées
+    """
+    return httpx.AsyncClient(timeout=TIMEOUT,
+                             transport=InstrumentedTransport(
+                                 http2=True, limits=httpx.Limits(max_connections=max_connections,
+                                                                 max_keepalive_connections=max_connections // 5)))
+
+
+async def query_plugins(client, page: int, browse: str = 'popular') -> httpx.Response:
+    """
+    Obtient une page de plugins de wordpress.org (action query_plugins).
+    :param client: Client HTTP (httpx.AsyncClient), ou ResponseCache
+    :param page: Numéro de page, à partir de 1
+    :param browse: Ordre des plugins (popular, new, updated...)
+    :return: Réponse de wordpress.org, dont le JSON contient les clés "info" et "plugins"
+    """
+    params = {
+        "action": "query_plugins",
+        "request[per_page]": PER_PAGE,
+        "request[page]": page,
+        "request[browse]": browse
+    }
+    return await client.get(BASE_URL, params=params)
@@ -0,0 +1,129 @@
+"""
+Job : CatalogSync
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional
+
+import httpx
+
+from clients.wordpress_org import PER_PAGE, query_plugins
+from storage.plugin_catalog import PluginCatalog, parse_last_updated
+
+logger = logging.getLogger(__name__)
+
+
+async def fetch_plugins(client: httpx.AsyncClient, page: int, browse: str = 'popular') -> dict:
+    """
+    Obtient une page de plugins de wordpress.org.
+    :return: Réponse JSON, avec les clés "info" et "plugins"
+    """
+    response = await query_plugins(client, page, browse)
+    response.raise_for_status()
+    return response.json()
+
+
+class CatalogSync:
+    """
+    Job synchronisant en background le catalogue local avec wordpress.org, dans la boucle asyncio de l'API.
+    La première synchronisation obtient toutes les pages en parallèle. Les suivantes ne parcourent que les plugins
+    récemment mis à jour (browse=updated), jusqu'à atteindre la dernière mise à jour déjà connue.
+    Une synchronisation complète est refaite périodiquement, afin de rafraîchir les rangs et nombres d'installations,
+    et de supprimer les plugins retirés de wordpress.org.
+    Les écritures dans le catalogue (SQLite) sont faites dans un thread, afin de ne pas bloquer la boucle.
+    """
+
+    def __init__(self, catalog: PluginCatalog):
+        """
+        Initialiser la job. Configurable via les variables d'environnement :
+        CATALOG_SYNC_INTERVAL (secondes entre deux synchronisations incrémentales, 0 pour désactiver),
+        CATALOG_FULL_SYNC_INTERVAL (secondes entre deux synchronisations complètes)
+        et CATALOG_SYNC_CONCURRENCY (nombre de pages obtenues simultanément).
+        :param catalog: Catalogue local à remplir
+        """
+        self.catalog = catalog
+        self.interval = int(os.environ.get('CATALOG_SYNC_INTERVAL', 3600))
+        self.full_sync_interval = int(os.environ.get('CATALOG_FULL_SYNC_INTERVAL', 7 * 24 * 3600))
+        self.concurrency = int(os.environ.get('CATALOG_SYNC_CONCURRENCY', 8))
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Vérifie si la synchronisation est activée.
+        """
+        return self.interval > 0
+
+    def start(self, client: httpx.AsyncClient):
+        """
+        Démarre la job dans la boucle asyncio courante.
+        :param client: Client HTTP partagé vers wordpress.org
+        """
+        self._task = asyncio.create_task(self._run(client))
+
+    async def stop(self):
+        """
+        Arrête la job, en annulant la synchronisation en cours.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, client: httpx.AsyncClient):
+        while True:
+            try:
+                last_full_sync = await asyncio.to_thread(self.catalog.get_state, 'last_full_sync')
+                if last_full_sync is None or time.time() - float(last_full_sync) > self.full_sync_interval:
+                    await self.full_sync(client)
+                else:
+                    await self.incremental_sync(client)
+            except (httpx.HTTPError, sqlite3.Error, ValueError, KeyError) as ex:
+                logger.warning('Catalog synchronization failed: %s', ex)
+            await asyncio.sleep(self.interval)
+
+    async def full_sync(self, client: httpx.AsyncClient):
+        """
+        Obtient toutes les pages du catalogue, en parallèle. Les plugins absents ne sont supprimés que si toutes les
+        pages ont été obtenues.
+        """
+        generation = await asyncio.to_thread(self.catalog.next_generation)
+        first_page = await fetch_plugins(client, 1)
+        await asyncio.to_thread(self.catalog.upsert_plugins, first_page['plugins'], 0, generation)
+        pages = int(first_page['info']['pages'])
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def sync_page(page: int):
+            async with semaphore:
+                data = await fetch_plugins(client, page)
+            await asyncio.to_thread(self.catalog.upsert_plugins, data['plugins'], (page - 1) * PER_PAGE, generation)
+
+        await asyncio.gather(*(sync_page(page) for page in range(2, pages + 1)))
+
+        removed = await asyncio.to_thread(self.catalog.mark_full_sync, generation)
+        logger.info('Catalog fully synchronized: %d plugins, %d removed', await asyncio.to_thread(self.catalog.count),
+                    removed)
+
+    async def incremental_sync(self, client: httpx.AsyncClient):
+        """
+        Obtient seulement les plugins mis à jour depuis la dernière synchronisation.
+        """
+        known_last_updated = await asyncio.to_thread(self.catalog.get_last_updated)
+        page = 1
+        while True:
+            data = await fetch_plugins(client, page, browse='updated')
+            await asyncio.to_thread(self.catalog.upsert_plugins, data['plugins'])
+            last_updated = [parse_last_updated(plugin.get('last_updated')) for plugin in data['plugins']]
+            oldest = min((value for value in last_updated if value is not None), default=None)
+            if page >= int(data['info']['pages']) or oldest is None or \
+                    (known_last_updated is not None and oldest <= known_last_updated):
+                return
+            page += 1
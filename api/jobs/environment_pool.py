@@ -0,0 +1,278 @@
+"""
+Job : EnvironmentPool
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass
+from threading import Event, Lock, Thread
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+WPGARLIC_ROOT = './wpgarlic'
+JOBS_ROOT = './wpgarlic_jobs'
+
+
+@dataclass
+class Environment:
+    """
+    Environnement WordPress (projet docker-compose et dossier de travail) réutilisé d'un fuzz à l'autre.
+    """
+    name: str
+    workdir: str
+    project_name: str
+    warm: bool = False  # Conteneurs démarrés et snapshot pris : l'environnement peut être réinitialisé
+    busy: bool = False
+    released_at: float = 0.0
+
+    @property
+    def results_folder(self) -> str:
+        """
+        Dossier des résultats écrits par le fuzzer.
+        """
+        return os.path.join(self.workdir, 'data', 'plugin_fuzz_results')
+
+    @property
+    def snapshot_path(self) -> str:
+        """
+        Dump de la base de données pris au démarrage de l'environnement.
+        """
+        return os.path.join(self.workdir, 'snapshot.sql')
+
+    @property
+    def tables_path(self) -> str:
+        """
+        Liste des tables de la base de données WordPress au moment du snapshot.
+        """
+        return os.path.join(self.workdir, 'snapshot.tables')
+
+
+class EnvironmentPool:  # pylint: disable=too-many-instance-attributes
+    """
+    Pool d'environnements WordPress pré-provisionnés, afin de ne pas payer le démarrage des conteneurs et
+    l'installation de WordPress à chaque fuzz.
+    Au premier usage, un environnement est démarré puis un snapshot est pris : dump de la base de données et copie
+    du dossier des plugins. Entre deux plugins, l'environnement est réinitialisé à partir de ce snapshot.
+    Le dump supprime et recrée la base de données WordPress à la restauration : les tables créées par un plugin ne
+    sont pas conservées pour le suivant, ce qui est vérifié après chaque réinitialisation.
+    Les environnements inutilisés depuis idle_timeout secondes sont arrêtés (docker-compose down), une fois start()
+    appelée. Les services et commandes sont configurables via les variables d'environnement WPGARLIC_DB_SERVICE,
+    WPGARLIC_WORDPRESS_SERVICE, WPGARLIC_PLUGINS_DIR, WPGARLIC_DB_NAME, WPGARLIC_DB_DUMP, WPGARLIC_DB_RESTORE et
+    WPGARLIC_DB_TABLES.
+    """
+
+    def __init__(self, size: int, idle_timeout: Optional[int] = None):
+        """
+        Initialiser le pool.
+        :param size: Nombre d'environnements, soit le nombre de fuzz simultanés
+        :param idle_timeout: Secondes d'inactivité avant l'arrêt d'un environnement, 0 pour l'arrêter après chaque
+        fuzz. Par défaut, la variable d'environnement WPGARLIC_ENV_IDLE_TIMEOUT (30 minutes si absente).
+        """
+        if idle_timeout is None:
+            idle_timeout = int(os.environ.get('WPGARLIC_ENV_IDLE_TIMEOUT', 1800))
+        self.idle_timeout = idle_timeout
+        self.db_service = os.environ.get('WPGARLIC_DB_SERVICE', 'db')
+        self.wordpress_service = os.environ.get('WPGARLIC_WORDPRESS_SERVICE', 'wordpress')
+        self.plugins_dir = os.environ.get('WPGARLIC_PLUGINS_DIR', '/var/www/html/wp-content/plugins')
+        db_name = os.environ.get('WPGARLIC_DB_NAME', 'wordpress')
+        self.db_dump = os.environ.get('WPGARLIC_DB_DUMP', 'mysqldump -uroot -p"$MYSQL_ROOT_PASSWORD" '
+                                                          f'--add-drop-database --databases {db_name}')
+        self.db_restore = os.environ.get('WPGARLIC_DB_RESTORE', 'mysql -uroot -p"$MYSQL_ROOT_PASSWORD"')
+        self.db_tables = os.environ.get('WPGARLIC_DB_TABLES', 'mysql -uroot -p"$MYSQL_ROOT_PASSWORD" -N -e "SELECT '
+                                                              'table_name FROM information_schema.tables WHERE '
+                                                              f'table_schema = \'{db_name}\' ORDER BY table_name"')
+        self.environments: List[Environment] = [
+            Environment(name=f'env{i}', workdir=os.path.join(JOBS_ROOT, f'wpgarlic_env{i}'),
+                        project_name=f'wpgarlic_env{i}')
+            for i in range(size)
+        ]
+        for environment in self.environments:
+            # Environnement laissé par une instance précédente de l'API : s'il n'est plus démarré, sa réinitialisation
+            # échouera et il sera recréé
+            environment.warm = os.path.isfile(environment.snapshot_path) and os.path.isfile(environment.tables_path)
+            environment.released_at = time.monotonic()
+        self._lock = Lock()
+        self._stopped = Event()
+        self._reaper: Optional[Thread] = None
+        # Appelée lorsqu'un environnement redevient libre hors d'une job (fin de l'arrêt pour inactivité)
+        self.on_free: Optional[Callable[[], None]] = None
+
+    def start(self):
+        """
+        Démarre l'arrêt des environnements inutilisés en background.
+        """
+        if self.idle_timeout > 0 and self._reaper is None:
+            self._reaper = Thread(target=self._reap_idle, name='environment-pool', daemon=True)
+            self._reaper.start()
+
+    def acquire(self) -> Optional[Environment]:
+        """
+        Réserve un environnement libre, de préférence déjà démarré.
+        :return: None si aucun environnement n'est libre : un environnement peut être en cours de libération
+        (docker-compose down) ou d'arrêt pour inactivité, même si son worker est disponible
+        """
+        with self._lock:
+            free = [environment for environment in self.environments if not environment.busy]
+            if not free:
+                return None
+            environment = max(free, key=lambda candidate: candidate.warm)
+            environment.busy = True
+            return environment
+
+    def adopt(self, name: str) -> Optional[Environment]:
+        """
+        Réserve un environnement précis, utilisé par une job reprise après un redémarrage de l'API.
+        :return: None si l'environnement n'existe pas (taille du pool modifiée) ou est déjà réservé
+        """
+        with self._lock:
+            for environment in self.environments:
+                if environment.name == name and not environment.busy:
+                    environment.busy = True
+                    return environment
+            return None
+
+    def prepare(self, environment: Environment):
+        """
+        Prépare un environnement pour un nouveau fuzz : réinitialisation à partir du snapshot s'il est démarré,
+        sinon création du dossier de travail, démarrage des conteneurs et prise du snapshot.
+        """
+        if environment.warm and self._reset(environment):
+            self._clean_results(environment)
+            return
+        self.teardown(environment)
+        shutil.copytree(WPGARLIC_ROOT, environment.workdir, symlinks=True,
+                        ignore=shutil.ignore_patterns('scanned_results', 'plugin_fuzz_results', 'output.json'))
+        self._clean_results(environment)
+        environment.warm = self._provision(environment)
+
+    def release(self, environment: Environment):
+        """
+        Libère un environnement après un fuzz. Il reste démarré jusqu'à son prochain usage ou son expiration.
+        """
+        if self.idle_timeout == 0:
+            self.teardown(environment)
+        with self._lock:
+            environment.busy = False
+            environment.released_at = time.monotonic()
+
+    def teardown(self, environment: Environment):
+        """
+        Arrête les conteneurs d'un environnement et supprime son dossier de travail.
+        """
+        if os.path.isdir(environment.workdir):
+            self._compose(environment, 'down')
+            shutil.rmtree(environment.workdir, ignore_errors=True)
+        environment.warm = False
+
+    def close(self):
+        """
+        Arrête tous les environnements inutilisés, par exemple à l'arrêt de l'API.
+        """
+        self._stopped.set()
+        for environment in self.environments:
+            if not environment.busy:
+                self.teardown(environment)
+
+    def _reap_idle(self):
+        while not self._stopped.wait(min(self.idle_timeout, 60)):
+            for environment in self.environments:
+                with self._lock:
+                    expired = environment.warm and not environment.busy and \
+                        time.monotonic() - environment.released_at > self.idle_timeout
+                    if expired:
+                        environment.busy = True  # Empêche l'acquisition pendant l'arrêt
+                if expired:
+                    logger.info('Tearing down idle WordPress environment %s', environment.name)
+                    self.teardown(environment)
+                    with self._lock:
+                        environment.busy = False
+                    if self.on_free is not None:
+                        self.on_free()
+
+    def _provision(self, environment: Environment) -> bool:
+        """
+        Démarre les conteneurs et prend le snapshot de l'environnement.
+        :return: False si le snapshot n'a pas pu être pris, l'environnement sera alors recréé au prochain fuzz
+        """
+        if not self._compose(environment, 'up', '-d'):
+            return False
+        for _ in range(30):  # La base de données peut prendre quelques secondes à démarrer
+            with open(environment.snapshot_path, 'wb') as snapshot:
+                if self._compose(environment, 'exec', '-T', self.db_service, 'sh', '-c', self.db_dump,
+                                 stdout=snapshot):
+                    break
+            time.sleep(2)
+        else:
+            logger.warning('Unable to snapshot the database of WordPress environment %s', environment.name)
+            return False
+        tables = self._list_tables(environment)
+        if tables is None:
+            return False
+        with open(environment.tables_path, 'wb') as tables_file:
+            tables_file.write(tables)
+        return self._compose(environment, 'exec', '-T', self.wordpress_service, 'sh', '-c',
+                             f'rm -rf "{self.plugins_dir}.pristine" && cp -a "{self.plugins_dir}" '
+                             f'"{self.plugins_dir}.pristine"')
+
+    def _reset(self, environment: Environment) -> bool:
+        """
+        Restaure la base de données et le dossier des plugins à partir du snapshot.
+        :return: False si la restauration a échoué, ou si des tables créées par le fuzz précédent subsistent
+        """
+        with open(environment.snapshot_path, 'rb') as snapshot:
+            if not self._compose(environment, 'exec', '-T', self.db_service, 'sh', '-c', self.db_restore,
+                                 stdin=snapshot):
+                return False
+        with open(environment.tables_path, 'rb') as tables_file:
+            expected_tables = tables_file.read()
+        if self._list_tables(environment) != expected_tables:
+            logger.warning('Tables of WordPress environment %s differ from its snapshot after reset',
+                           environment.name)
+            return False
+        return self._compose(environment, 'exec', '-T', self.wordpress_service, 'sh', '-c',
+                             f'rm -rf "{self.plugins_dir}" && cp -a "{self.plugins_dir}.pristine" '
+                             f'"{self.plugins_dir}"')
+
+    def _list_tables(self, environment: Environment) -> Optional[bytes]:
+        """
+        Obtient la liste des tables de la base de données WordPress, None si la commande a échoué.
+        """
+        with tempfile.TemporaryFile() as output:
+            if not self._compose(environment, 'exec', '-T', self.db_service, 'sh', '-c', self.db_tables,
+                                 stdout=output):
+                return None
+            output.seek(0)
+            return output.read()
+
+    @staticmethod
+    def _clean_results(environment: Environment):
+        """
+        Supprime les résultats du fuzz précédent.
+        """
+        shutil.rmtree(environment.results_folder, ignore_errors=True)
+        os.makedirs(environment.results_folder)
+        for file_name in ('output.json', 'output.json.tmp', 'fuzz_done', 'fuzz.log', 'fuzz_exit',
+                          'findings_timings.json'):
+            try:
+                os.remove(os.path.join(environment.workdir, 'data', file_name))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _compose(environment: Environment, *args: str, stdin=None, stdout=subprocess.DEVNULL) -> bool:
+        """
+        Exécute une commande docker-compose dans le projet de l'environnement.
+        :return: True si la commande a réussi
+        """
+        try:
+            completed = subprocess.run(['docker-compose', *args], cwd=environment.workdir,
+                                       env={**os.environ, 'COMPOSE_PROJECT_NAME': environment.project_name},
+                                       stdin=stdin, stdout=stdout, stderr=subprocess.DEVNULL, check=False)
+        except OSError:
+            return False
+        return completed.returncode == 0
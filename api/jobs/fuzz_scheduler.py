@@ -0,0 +1,547 @@
+"""
+Job : FuzzScheduler
+"""
+
+import json
+import logging
+import os
+import subprocess
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from enum import Enum, auto
+from threading import Lock, Thread
+from typing import Callable, Deque, Dict, List, Optional, Union
+
+from jobs.environment_pool import Environment, EnvironmentPool
+from jobs.resource_limits import JobCgroup, ResourceLimits, ResourceUsage
+from jobs.watch_process import AdoptedProcess, ProcessResult, WatchProcess
+from metrics import JOB_STAGE_DURATION, JOBS_COMPLETED
+from storage.job_store import JobStore
+
+logger = logging.getLogger(__name__)
+
+
+class FuzzerState(Enum):
+    """
+    États possible d'une job du Fuzzer
+    """
+    NOT_STARTED = auto()
+    QUEUED = auto()
+    BUILDING = auto()
+    FUZZING = auto()
+    PROCESSING = auto()
+    FINISHED = auto()
+    FAILED = auto()
+
+
+ACTIVE_STATES = (FuzzerState.BUILDING, FuzzerState.FUZZING, FuzzerState.PROCESSING)
+DONE_STATES = (FuzzerState.FINISHED, FuzzerState.FAILED)
+
+# Le code de retour du fuzzer est écrit dans data/fuzz_exit, afin d'être connu même si l'API a redémarré entre-temps
+FUZZ_COMMAND = 'python fuzz_plugin.py "$1"; status=$?; echo $status > data/fuzz_exit; exit $status'
+
+
+@dataclass
+class FuzzProgress:
+    """
+    Progression du fuzz d'une job, mise à jour à chaque ligne de la sortie de fuzz_plugin.py.
+    """
+    started_at: float = field(default_factory=time.time)
+    lines: int = 0
+    last_line: str = ''
+    results: Optional[int] = None  # Nombre de fichiers/actions fuzzés, une fois le fuzz terminé
+
+    def update(self, line: str):
+        """
+        Prend en compte une ligne de la sortie du fuzzer.
+        """
+        self.lines += 1
+        if line.strip():
+            self.last_line = line.strip()[:500]
+
+
+@dataclass
+class FuzzJob:  # pylint: disable=too-many-instance-attributes
+    """
+    Job de fuzzing d'un plugin, exécutée dans un environnement du pool (dossier de travail et projet docker-compose).
+    """
+    slug: str
+    state: FuzzerState = FuzzerState.QUEUED
+    environment: Optional[Environment] = field(default=None, repr=False)
+    process: Union[subprocess.Popen, AdoptedProcess, None] = field(default=None, repr=False)
+    returncode: Optional[int] = None
+    wall_time: Optional[float] = None
+    progress: Optional[FuzzProgress] = None
+    findings_process: Union[subprocess.Popen, AdoptedProcess, None] = field(default=None, repr=False)
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    cgroup: Optional[JobCgroup] = field(default=None, repr=False)
+    usage: Optional[ResourceUsage] = None
+    results_seen: int = field(default=0, repr=False)
+    partial_output: tuple = field(default=(None, {}), repr=False)  # (mtime de data/output.json, résumé)
+
+    @property
+    def cgroup_name(self) -> str:
+        """
+        Nom du cgroup de la job.
+        """
+        return f'fuzz-{self.slug}'
+
+    @property
+    def workdir(self) -> Optional[str]:
+        """
+        Dossier de travail de la job, None tant qu'elle n'est pas démarrée.
+        """
+        return self.environment.workdir if self.environment is not None else None
+
+    @property
+    def project_name(self) -> Optional[str]:
+        """
+        Nom du projet docker-compose de la job, None tant qu'elle n'est pas démarrée.
+        """
+        return self.environment.project_name if self.environment is not None else None
+
+    @property
+    def log_path(self) -> str:
+        """
+        Fichier de sortie (stdout et stderr) du fuzzer.
+        """
+        return os.path.join(self.workdir, 'data', 'fuzz.log')
+
+    @property
+    def exit_path(self) -> str:
+        """
+        Fichier contenant le code de retour du fuzzer, une fois celui-ci terminé.
+        """
+        return os.path.join(self.workdir, 'data', 'fuzz_exit')
+
+    @property
+    def results_folder(self) -> str:
+        """
+        Dossier des résultats écrits par le fuzzer, un fichier JSON par fichier/action fuzzé.
+        """
+        return self.environment.results_folder
+
+    def count_results(self) -> int:
+        """
+        Obtient le nombre de fichiers/actions déjà fuzzés.
+        Pendant le fuzz, print_findings.py (--follow) déplace les rapports sans trouvaille dans scanned/, puis les
+        archive, éventuellement hors du dossier de travail (--archive-bundle) : le nombre de fichiers analysés qu'il
+        indique dans data/output.json est aussi pris en compte, et le nombre retourné ne diminue jamais.
+        """
+        reports = set()
+        for folder in (self.results_folder, os.path.join(self.results_folder, 'scanned')):
+            try:
+                with os.scandir(folder) as entries:
+                    # Un rapport en cours de déplacement ou de compression n'est compté qu'une fois
+                    reports.update(entry.name[:-len('.gz')] if entry.name.endswith('.gz') else entry.name
+                                   for entry in entries if entry.name.endswith(('.json', '.json.gz')))
+            except FileNotFoundError:
+                pass
+        self.results_seen = max(self.results_seen, len(reports), self.read_partial_output().get('files', 0))
+        return self.results_seen
+
+    def read_partial_output(self) -> dict:
+        """
+        Obtient le résumé des résultats partiels (data/output.json) écrits par print_findings.py --follow.
+        Le fichier n'est relu que s'il a été remplacé depuis la dernière lecture.
+        """
+        if self.workdir is None:
+            return {}
+        output_path = os.path.join(self.workdir, 'data', 'output.json')
+        try:
+            mtime = os.stat(output_path).st_mtime_ns
+            if mtime != self.partial_output[0]:
+                with open(output_path, 'rb') as output_file:
+                    output = json.load(output_file)
+                # filepaths_total : "Unique filepaths total: <nombre de fichiers analysés>"
+                self.partial_output = (mtime, {'files': int(output['filepaths_total'].rsplit(':', 1)[-1]),
+                                               'findings': len(output['data'])})
+        except (OSError, ValueError, KeyError, AttributeError) as ex:
+            logger.debug('Unable to read the partial results of %s: %s', self.slug, ex)
+        return self.partial_output[1]
+
+    def progress_dict(self) -> Optional[dict]:
+        """
+        Représentation sérialisable de la progression du fuzz, None s'il n'est pas démarré.
+        """
+        if self.progress is None:
+            return None
+        elapsed = (self.wall_time if self.wall_time is not None else time.time() - self.progress.started_at)
+        results = self.count_results() if self.state == FuzzerState.FUZZING else self.progress.results
+        # Une fois la job terminée, son dossier de travail peut être réutilisé : le dernier résumé lu est conservé
+        partial = (self.read_partial_output() if self.state in (FuzzerState.FUZZING, FuzzerState.PROCESSING)
+                   else self.partial_output[1])
+        return {
+            'elapsed': round(elapsed, 1),
+            'results': results,
+            'results_per_minute': round(60 * results / elapsed, 2) if results is not None and elapsed > 0 else None,
+            'findings': partial.get('findings'),
+            'lines': self.progress.lines,
+            'last_line': self.progress.last_line
+        }
+
+    def to_dict(self) -> dict:
+        """
+        Représentation sérialisable de la job.
+        """
+        return {
+            'slug': self.slug,
+            'state': self.state.name,
+            'project_name': self.project_name,
+            'pid': self.process.pid if self.process is not None else None,
+            'returncode': self.returncode,
+            'wall_time': self.wall_time,
+            'usage': asdict(self.usage) if self.usage is not None else None,
+            'progress': self.progress_dict()
+        }
+
+    def to_record(self) -> dict:
+        """
+        Représentation de la job enregistrée dans le JobStore.
+        """
+        return {
+            'slug': self.slug,
+            'state': self.state.name,
+            'pid': self.process.pid if self.process is not None else None,
+            'findings_pid': self.findings_process.pid if self.findings_process is not None else None,
+            'environment': self.environment.name if self.environment is not None else None,
+            'workdir': self.workdir,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'returncode': self.returncode,
+            'wall_time': self.wall_time,
+            **(asdict(self.usage) if self.usage is not None else {})
+        }
+
+
+def get_default_workers() -> int:
+    """
+    Obtient la taille du pool de workers, configurable via la variable d'environnement FUZZ_WORKERS.
+    Par défaut, un fuzz par tranche de 4 coeurs, puisque chaque fuzz démarre plusieurs conteneurs.
+    """
+    return max(1, int(os.environ.get('FUZZ_WORKERS', (os.cpu_count() or 1) // 4)))
+
+
+class FuzzScheduler:  # pylint: disable=too-many-instance-attributes
+    """
+    Ordonnanceur permettant de fuzzer plusieurs plugins en parallèle.
+    Les jobs soumises au-delà de la capacité du pool sont mises en file d'attente.
+    Chaque worker dispose d'un environnement WordPress, réutilisé d'un plugin à l'autre.
+    Si un JobStore est fourni, chaque transition d'état y est enregistrée et recover() reprend les jobs après un
+    redémarrage de l'API : les fuzz toujours en cours sont adoptés, les autres sont remis en file d'attente.
+    Les jobs terminées sont conservées JOBS_RETENTION secondes après leur soumission (une semaine par défaut).
+    """
+
+    def __init__(self, max_workers: int, on_finish: Callable[[FuzzJob], None],
+                 on_start: Optional[Callable[[FuzzJob], None]] = None, store: Optional[JobStore] = None):
+        """
+        Initialiser l'ordonnanceur.
+        :param max_workers: Nombre maximal de fuzz exécutés simultanément
+        :param on_finish: Fonction à appeler (post-traitement) lorsque le fuzz d'une job est terminé
+        :param on_start: Fonction à appeler lorsque le fuzz d'une job vient de démarrer
+        :param store: Stockage persistant des jobs
+        """
+        self.max_workers = max_workers
+        self.on_finish = on_finish
+        self.on_start = on_start
+        self.store = store
+        self.retention = float(os.environ.get('JOBS_RETENTION', 7 * 24 * 3600))
+        self.limits = ResourceLimits.from_environ()
+        self.pool = EnvironmentPool(max_workers)
+        self.pool.on_free = self._dispatch
+        self.jobs: Dict[str, FuzzJob] = {}
+        self._queue: Deque[FuzzJob] = deque()
+        self._lock = Lock()
+
+    def submit(self, slug: str) -> FuzzJob:
+        """
+        Ajoute un plugin à la file d'attente et démarre les jobs si des workers sont disponibles.
+        La préparation de l'environnement et le démarrage du fuzzer sont faits en background : la job est retournée
+        dans l'état QUEUED ou BUILDING.
+        :param slug: Nom (slug name) du plugin WordPress
+        :return: La job créée
+        """
+        job = FuzzJob(slug=slug)
+        with self._lock:
+            self.jobs[slug] = job
+            self._queue.append(job)
+        self._save(job)
+        self._dispatch()
+        return job
+
+    def get_job(self, slug: str) -> Optional[FuzzJob]:
+        """
+        Obtient la job d'un plugin, si elle existe.
+        """
+        return self.jobs.get(slug)
+
+    def all_jobs(self) -> List[FuzzJob]:
+        """
+        Obtient toutes les jobs connues. La liste est une copie : les threads des jobs peuvent modifier le
+        dictionnaire des jobs pendant qu'elle est parcourue.
+        """
+        with self._lock:
+            return list(self.jobs.values())
+
+    def active_jobs(self) -> List[FuzzJob]:
+        """
+        Obtient les jobs occupant présentement un worker.
+        """
+        return [job for job in self.all_jobs() if job.state in ACTIVE_STATES]
+
+    def count_jobs(self) -> Dict[str, int]:
+        """
+        Obtient le nombre de jobs par état.
+        """
+        counts = {state.name: 0 for state in FuzzerState}
+        for job in self.all_jobs():
+            counts[job.state.name] += 1
+        return counts
+
+    def queued_jobs(self) -> List[FuzzJob]:
+        """
+        Obtient les jobs en attente d'un worker, dans l'ordre de soumission.
+        """
+        with self._lock:
+            return list(self._queue)
+
+    def _dispatch(self):
+        """
+        Démarre les jobs en attente tant qu'il reste des workers et des environnements disponibles.
+        L'environnement est réservé ici : une job n'est démarrée que si un environnement est libre, sinon elle reste
+        en file d'attente jusqu'à la prochaine libération.
+        Chaque job est préparée dans son propre thread, puisque le provisionnement d'un environnement peut prendre
+        plusieurs minutes.
+        """
+        while True:
+            with self._lock:
+                active = sum(1 for job in self.jobs.values() if job.state in ACTIVE_STATES)
+                if not self._queue or active >= self.max_workers:
+                    return
+                environment = self.pool.acquire()
+                if environment is None:
+                    return
+                job = self._queue.popleft()
+                job.environment = environment
+                job.state = FuzzerState.BUILDING
+            Thread(target=self._launch, args=(job,), name=f'launch-{job.slug}').start()
+
+    def _launch(self, job: FuzzJob):
+        """
+        Prépare l'environnement réservé pour la job et démarre fuzz_plugin.py.
+        """
+        try:
+            self._save(job)
+            self.pool.prepare(job.environment)
+            job.cgroup = self.limits.create_cgroup(job.cgroup_name)
+
+            # La sortie est écrite dans un fichier et le fuzzer a sa propre session : il survit à l'arrêt de l'API
+            with open(job.log_path, 'wb') as log_file:
+                # pylint: disable=consider-using-with,subprocess-popen-preexec-fn
+                # L'utilisation de with (context manager) n'est pas viable puisque le processus roule en background.
+                # preexec_fn n'écrit qu'un fichier et appelle setrlimit, sans prendre de verrou.
+                job.process = subprocess.Popen(['sh', '-c', FUZZ_COMMAND, 'sh', job.slug], cwd=job.workdir,
+                                               env={**os.environ, 'COMPOSE_PROJECT_NAME': job.project_name,
+                                                    'PYTHONUNBUFFERED': '1'},
+                                               stdout=log_file, stderr=subprocess.STDOUT, start_new_session=True,
+                                               preexec_fn=self.limits.preexec(job.cgroup))
+        except Exception:  # pylint: disable=broad-except
+            # La job ne doit pas rester BUILDING, ni conserver son worker
+            logger.exception('Unable to start the fuzzer for %s', job.slug)
+            if job.cgroup is not None:
+                job.cgroup.remove()
+                job.cgroup = None
+            # L'environnement est libéré avant que la job quitte les états actifs, afin que la job suivante le trouve
+            self.pool.release(job.environment)
+            job.state = FuzzerState.FAILED
+            JOBS_COMPLETED.labels(job.state.name.lower()).inc()
+            self._save(job)
+            self._dispatch()
+            return
+        job.started_at = time.time()
+        JOB_STAGE_DURATION.labels('queue').observe(job.started_at - job.submitted_at)
+        job.progress = FuzzProgress(started_at=job.started_at)
+        job.state = FuzzerState.FUZZING
+        # Avant la surveillance : un fuzzer qui se termine immédiatement ne doit pas être post-traité avant
+        if self.on_start is not None:
+            try:
+                self.on_start(job)
+            except Exception:  # pylint: disable=broad-except
+                # Le fuzzer est démarré : il est surveillé même si on_start a échoué
+                logger.exception('on_start failed for %s', job.slug)
+        WatchProcess(job.process, on_finish=self._finish, args=job, on_output=self._output,
+                     log_path=job.log_path).start()
+        self._save(job)
+
+    @staticmethod
+    def _output(job: FuzzJob, line: str):
+        """
+        Lorsque le fuzzer écrit une ligne : mise à jour de la progression de la job.
+        """
+        job.progress.update(line)
+
+    def _finish(self, job: FuzzJob, result: ProcessResult):
+        """
+        Lorsque le fuzz d'une job est terminé : post-traitement, puis libération du worker.
+        """
+        job.progress.results = job.count_results()
+        job.state = FuzzerState.PROCESSING
+        job.process = None
+        job.returncode = result.returncode if result.returncode is not None else self._read_returncode(job)
+        job.wall_time = result.wall_time
+        JOB_STAGE_DURATION.labels('fuzz').observe(result.wall_time)
+        if job.cgroup is not None:
+            job.usage = job.cgroup.usage()
+            job.cgroup.remove()
+            job.cgroup = None
+        elif result.rusage is not None:
+            job.usage = ResourceUsage.from_rusage(result.rusage)
+        self._save(job)
+        self._process(job)
+
+    def _process(self, job: FuzzJob):
+        """
+        Post-traitement d'une job dont le fuzz est terminé, puis libération du worker.
+        """
+        started = time.monotonic()
+        state = FuzzerState.FAILED
+        try:
+            self.on_finish(job)
+            state = FuzzerState.FINISHED
+        except Exception:  # pylint: disable=broad-except
+            # La job ne doit pas rester PROCESSING, ni conserver son worker
+            logger.exception('Processing of %s failed', job.slug)
+        finally:
+            JOB_STAGE_DURATION.labels('processing').observe(time.monotonic() - started)
+            job.findings_process = None
+            # L'environnement est libéré avant que la job quitte les états actifs : une job démarrée dès que le worker
+            # est disponible le trouve libre, même si sa libération (docker-compose down) prend plusieurs secondes
+            self.pool.release(job.environment)
+            job.state = state
+            JOBS_COMPLETED.labels(job.state.name.lower()).inc()
+            self._save(job)
+            self._prune()
+            self._dispatch()
+
+    @staticmethod
+    def _read_returncode(job: FuzzJob) -> Optional[int]:
+        """
+        Lit le code de retour du fuzzer, lorsque le processus n'était pas un enfant de l'API (job reprise).
+        """
+        try:
+            with open(job.exit_path, 'r', encoding='utf-8') as exit_file:
+                return int(exit_file.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def _prune(self):
+        """
+        Oublie les jobs terminées dont la durée de conservation est écoulée.
+        """
+        before = time.time() - self.retention
+        with self._lock:
+            for job in [job for job in self.jobs.values() if job.state in DONE_STATES and job.submitted_at < before]:
+                del self.jobs[job.slug]
+        if self.store is not None:
+            self.store.delete_finished(before)
+
+    def _save(self, job: FuzzJob):
+        """
+        Enregistre l'état d'une job dans le stockage persistant.
+        """
+        if self.store is not None:
+            self.store.save(job.to_record())
+
+    def start(self):
+        """
+        Démarre les jobs en background de l'ordonnanceur, au démarrage de l'API : arrêt des environnements
+        inutilisés et reprise des jobs enregistrées.
+        """
+        self.pool.start()
+        self.recover()
+
+    def recover(self):
+        """
+        Reprend les jobs enregistrées par une instance précédente de l'API, au démarrage.
+        Un fuzz toujours en cours est adopté (surveillance de son PID et lecture de son fichier de sortie), un fuzz
+        terminé pendant l'arrêt est post-traité, et une job interrompue est remise en file d'attente.
+        La surveillance et le post-traitement des jobs reprises ne démarrent qu'une fois toutes les jobs reprises :
+        une job terminée libère son environnement et démarre la suivante, qui ne doit pas prendre celui d'une job
+        pas encore adoptée.
+        """
+        if self.store is None:
+            return
+        self._prune()
+        resumed = []
+        for record in self.store.get_jobs():
+            job = FuzzJob(slug=record['slug'], state=FuzzerState[record['state']],
+                          submitted_at=record['submitted_at'], started_at=record['started_at'],
+                          returncode=record['returncode'], wall_time=record['wall_time'])
+            if record['cpu_seconds'] is not None:
+                job.usage = ResourceUsage(cpu_seconds=record['cpu_seconds'], max_rss=record['max_rss'],
+                                          read_bytes=record['read_bytes'], write_bytes=record['write_bytes'])
+            with self._lock:
+                self.jobs[job.slug] = job
+            if job.state in DONE_STATES:
+                continue
+            if job.state in (FuzzerState.FUZZING, FuzzerState.PROCESSING) and self._resume(job, record, resumed):
+                continue
+            job.state = FuzzerState.QUEUED
+            job.started_at = None
+            with self._lock:
+                self._queue.append(job)
+            self._save(job)
+        for watcher in resumed:
+            watcher.start()
+        self._dispatch()
+
+    def _resume(self, job: FuzzJob, record: dict, resumed: List[Union[Thread, WatchProcess]]) -> bool:
+        """
+        Reprend une job en cours de fuzz ou de post-traitement, dans son environnement.
+        :param resumed: Liste à laquelle est ajoutée la surveillance ou le post-traitement de la job, à démarrer une
+        fois toutes les jobs reprises
+        :return: False si la job doit être recommencée (fuzzer interrompu, environnement disparu)
+        """
+        if record['workdir'] is None or job.started_at is None:
+            return False
+        fuzzer = AdoptedProcess(record['pid']) if record['pid'] is not None else None
+        running = fuzzer is not None and fuzzer.matches(record['workdir'], 'fuzz_plugin.py', job.slug)
+        if job.state == FuzzerState.FUZZING and not running and \
+                not os.path.isfile(os.path.join(record['workdir'], 'data', 'fuzz_exit')):
+            return False
+        job.environment = self.pool.adopt(record['environment'])
+        if job.environment is None:
+            return False
+        if job.environment.workdir != record['workdir']:
+            self.pool.release(job.environment)
+            job.environment = None
+            return False
+
+        if record['findings_pid'] is not None:
+            findings_process = AdoptedProcess(record['findings_pid'])
+            if findings_process.matches(job.workdir, 'print_findings.py'):
+                job.findings_process = findings_process
+        job.progress = FuzzProgress(started_at=job.started_at)
+        if job.state == FuzzerState.PROCESSING:
+            job.progress.results = job.count_results()
+            resumed.append(Thread(target=self._process, args=(job,)))
+        elif running:
+            job.cgroup = self.limits.open_cgroup(job.cgroup_name)
+            job.process = fuzzer
+            resumed.append(WatchProcess(job.process, on_finish=self._finish, args=job, on_output=self._output,
+                                        log_path=job.log_path, elapsed=time.time() - job.started_at))
+        else:
+            # Le fuzz s'est terminé pendant l'arrêt de l'API, le cgroup contient toujours sa consommation
+            job.cgroup = self.limits.open_cgroup(job.cgroup_name)
+            wall_time = os.path.getmtime(job.exit_path) - job.started_at
+            result = ProcessResult(returncode=None, wall_time=wall_time)
+            resumed.append(Thread(target=self._finish, args=(job, result)))
+        return True
+
+    def close(self):
+        """
+        Arrête les environnements WordPress inutilisés, à l'arrêt de l'API.
+        """
+        self.pool.close()
@@ -0,0 +1,183 @@
+"""
+Job : ResourceLimits
+"""
+
+import logging
+import os
+import resource
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+CPU_PERIOD = 100000  # Période (µs) de cpu.max
+CGROUP_CONTROLLERS = ('cpu', 'memory', 'io')
+
+
+def parse_size(value: str) -> int:
+    """
+    Convertit une taille (ex. 512M, 2G) en octets.
+    """
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    value = value.strip().upper().rstrip('B')
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+@dataclass
+class ResourceUsage:
+    """
+    Consommation de ressources du fuzzer d'une job (processus et descendants).
+    """
+    cpu_seconds: Optional[float] = None
+    max_rss: Optional[int] = None  # Octets
+    read_bytes: Optional[int] = None
+    write_bytes: Optional[int] = None
+
+    @classmethod
+    def from_rusage(cls, rusage: resource.struct_rusage) -> 'ResourceUsage':
+        """
+        Consommation obtenue via os.wait4, lorsque la job n'a pas de cgroup.
+        Les I/O ne comptent que les accès au disque (blocs de 512 octets), pas ceux servis par le cache.
+        """
+        return cls(cpu_seconds=round(rusage.ru_utime + rusage.ru_stime, 3), max_rss=rusage.ru_maxrss * 1024,
+                   read_bytes=rusage.ru_inblock * 512, write_bytes=rusage.ru_oublock * 512)
+
+
+class JobCgroup:
+    """
+    Cgroup (v2) d'une job, contenant le fuzzer et tous ses descendants.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def join(self):
+        """
+        Déplace le processus courant dans le cgroup (appelé dans le processus enfant, avant exec).
+        """
+        with open(os.path.join(self.path, 'cgroup.procs'), 'w', encoding='utf-8') as procs:
+            procs.write(str(os.getpid()))
+
+    def usage(self) -> ResourceUsage:
+        """
+        Obtient la consommation de ressources cumulée du cgroup.
+        memory.peak nécessite Linux >= 5.19.
+        """
+        usage = ResourceUsage()
+        cpu_stat = dict(line.split() for line in self._read('cpu.stat').splitlines())
+        if 'usage_usec' in cpu_stat:
+            usage.cpu_seconds = round(int(cpu_stat['usage_usec']) / 1e6, 3)
+        peak = self._read('memory.peak').strip()
+        if peak.isdigit():
+            usage.max_rss = int(peak)
+        io_stat = self._read('io.stat')
+        if io_stat:
+            stats = [dict(field.split('=', 1) for field in line.split()[1:]) for line in io_stat.splitlines()]
+            usage.read_bytes = sum(int(device.get('rbytes', 0)) for device in stats)
+            usage.write_bytes = sum(int(device.get('wbytes', 0)) for device in stats)
+        else:
+            usage.read_bytes = usage.write_bytes = 0
+        return usage
+
+    def remove(self):
+        """
+        Supprime le cgroup, une fois tous ses processus terminés.
+        """
+        try:
+            os.rmdir(self.path)
+        except OSError as ex:
+            logger.warning('Unable to remove cgroup %s: %s', self.path, ex)
+
+    def _read(self, file_name: str) -> str:
+        try:
+            with open(os.path.join(self.path, file_name), 'r', encoding='utf-8') as cgroup_file:
+                return cgroup_file.read()
+        except OSError:
+            return ''
+
+
+@dataclass
+class ResourceLimits:
+    """
+    Limites de ressources appliquées au fuzzer de chaque job.
+    Si cgroup_root est un cgroup v2 accessible en écriture, chaque job est exécutée dans son propre cgroup : les quotas
+    s'appliquent au fuzzer et à tous ses descendants, et la consommation est mesurée par le cgroup.
+    Sinon, les limites sont appliquées par processus via setrlimit et la consommation est mesurée via os.wait4.
+    Les conteneurs WordPress, démarrés par le démon Docker, ne sont couverts ni par l'un ni par l'autre.
+    """
+    cpu_quota: Optional[float] = None  # Nombre de coeurs (cgroup seulement)
+    memory_max: Optional[int] = None  # Octets (cgroup, sinon RLIMIT_AS par processus)
+    cpu_time: Optional[int] = None  # Secondes de CPU par processus (RLIMIT_CPU)
+    cgroup_root: Optional[str] = None
+
+    @classmethod
+    def from_environ(cls) -> 'ResourceLimits':
+        """
+        Obtient les limites configurées via les variables d'environnement FUZZ_CPU_QUOTA, FUZZ_MEMORY_MAX,
+        FUZZ_CPU_TIME et FUZZ_CGROUP_ROOT.
+        """
+        cpu_quota = os.environ.get('FUZZ_CPU_QUOTA')
+        memory_max = os.environ.get('FUZZ_MEMORY_MAX')
+        cpu_time = os.environ.get('FUZZ_CPU_TIME')
+        return cls(cpu_quota=float(cpu_quota) if cpu_quota else None,
+                   memory_max=parse_size(memory_max) if memory_max else None,
+                   cpu_time=int(cpu_time) if cpu_time else None,
+                   cgroup_root=os.environ.get('FUZZ_CGROUP_ROOT') or None)
+
+    def create_cgroup(self, name: str) -> Optional[JobCgroup]:
+        """
+        Crée le cgroup d'une job et y applique les quotas.
+        :return: None si les cgroups ne sont pas configurés ou pas disponibles
+        """
+        if self.cgroup_root is None:
+            return None
+        path = os.path.join(self.cgroup_root, name)
+        try:
+            with open(os.path.join(self.cgroup_root, 'cgroup.subtree_control'), 'w', encoding='utf-8') as control:
+                control.write(' '.join(f'+{controller}' for controller in CGROUP_CONTROLLERS))
+            if os.path.isdir(path):
+                os.rmdir(path)  # Cgroup d'un fuzz précédent du même plugin
+            os.mkdir(path)
+            if self.cpu_quota is not None:
+                with open(os.path.join(path, 'cpu.max'), 'w', encoding='utf-8') as cpu_max:
+                    cpu_max.write(f'{int(self.cpu_quota * CPU_PERIOD)} {CPU_PERIOD}')
+            if self.memory_max is not None:
+                with open(os.path.join(path, 'memory.max'), 'w', encoding='utf-8') as memory_max:
+                    memory_max.write(str(self.memory_max))
+        except OSError as ex:
+            logger.warning('Unable to create cgroup %s, falling back to rlimits: %s', path, ex)
+            if os.path.isdir(path):
+                JobCgroup(path).remove()
+            return None
+        return JobCgroup(path)
+
+    def open_cgroup(self, name: str) -> Optional[JobCgroup]:
+        """
+        Obtient le cgroup existant d'une job, reprise après un redémarrage de l'API.
+        """
+        if self.cgroup_root is None or not os.path.isdir(os.path.join(self.cgroup_root, name)):
+            return None
+        return JobCgroup(os.path.join(self.cgroup_root, name))
+
+    def preexec(self, cgroup: Optional[JobCgroup]) -> Optional[Callable[[], None]]:
+        """
+        Obtient la fonction à exécuter dans le processus enfant avant exec (preexec_fn de Popen).
+        :param cgroup: Cgroup de la job, None pour appliquer les limites via setrlimit
+        :return: None s'il n'y a aucune limite à appliquer
+        """
+        limits = []
+        if self.cpu_time is not None:
+            limits.append((resource.RLIMIT_CPU, self.cpu_time))
+        if cgroup is None and self.memory_max is not None:
+            limits.append((resource.RLIMIT_AS, self.memory_max))
+        if cgroup is None and not limits:
+            return None
+
+        def apply():
+            if cgroup is not None:
+                cgroup.join()
+            for limit, value in limits:
+                resource.setrlimit(limit, (value, value))
+        return apply
@@ -0,0 +1,112 @@
+"""
+Job : StatusChecks
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import time
+from contextlib import suppress
+from pathlib import Path
+from typing import Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DOCKER_PING_TIMEOUT = 2
+
+
+class StatusChecks:
+    """
+    Job rafraîchissant en background les vérifications du statut de l'API, dans la boucle asyncio de l'API.
+    Les requêtes de statut ne font que lire le dernier résultat : aucun processus n'est démarré, et une sonde fréquente
+    (liveness/readiness) ne coûte rien, même lorsque le démon Docker est chargé.
+    Docker est vérifié via sa présence dans le PATH et son socket (GET /_ping), et docker-compose via sa présence dans
+    le PATH.
+    """
+
+    def __init__(self):
+        """
+        Initialiser la job. Configurable via les variables d'environnement :
+        STATUS_REFRESH_INTERVAL (secondes entre deux vérifications, 0 pour vérifier à chaque requête)
+        et DOCKER_SOCKET (socket du démon Docker).
+        """
+        self.interval = float(os.environ.get('STATUS_REFRESH_INTERVAL', 30))
+        self.docker_socket = os.environ.get('DOCKER_SOCKET', '/var/run/docker.sock')
+        self.checks: Optional[Dict[str, bool]] = None
+        self.checked_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Vérifie si le rafraîchissement en background est activé.
+        """
+        return self.interval > 0
+
+    @property
+    def stale(self) -> bool:
+        """
+        Vérifie si le dernier résultat est trop vieux, par exemple si le rafraîchissement est bloqué.
+        """
+        return self.checked_at is None or time.time() - self.checked_at > 3 * max(self.interval, DOCKER_PING_TIMEOUT)
+
+    def start(self):
+        """
+        Démarre la job dans la boucle asyncio courante.
+        """
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Arrête la job.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def get_checks(self) -> Dict[str, bool]:
+        """
+        Obtient le résultat des vérifications, en les faisant immédiatement si le rafraîchissement est désactivé
+        ou n'a pas encore eu lieu.
+        """
+        if not self.enabled or self.checks is None:
+            await self.refresh()
+        return self.checks
+
+    async def refresh(self):
+        """
+        Fait toutes les vérifications.
+        """
+        self.checks = {
+            'wpgarlic_root': Path('wpgarlic').is_dir(),
+            'wpgarlic_exec': Path('wpgarlic/fuzz_plugin.py').is_file(),
+            'docker': shutil.which('docker') is not None and await self.ping_docker(),
+            'docker-compose': shutil.which('docker-compose') is not None
+        }
+        self.checked_at = time.time()
+
+    async def ping_docker(self) -> bool:
+        """
+        Vérifie que le démon Docker répond, via son socket.
+        """
+        try:
+            async with httpx.AsyncClient(transport=httpx.AsyncHTTPTransport(uds=self.docker_socket),
+                                         timeout=DOCKER_PING_TIMEOUT) as client:
+                response = await client.get('http://docker/_ping')
+        except httpx.HTTPError:
+            return False
+        return response.status_code == 200
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:  # pylint: disable=broad-except
+                # Une erreur inattendue ne doit pas arrêter le rafraîchissement
+                logger.exception('Status checks failed')
+            await asyncio.sleep(self.interval)
@@ -2,34 +2,262 @@
 Job : WatchWPGarlic
 """
 
+import os
+import resource
+import selectors
+import time
+from dataclasses import dataclass
 from subprocess import Popen
-from threading import Thread
-from typing import Callable
+from threading import Lock, Thread
+from typing import Any, Callable, List, Optional, Tuple, Union
 
+TAIL_INTERVAL = 1.0
 
-class WatchProcess(Thread):
+
+@dataclass
+class ProcessResult:
+    """
+    Résultat d'un processus terminé, transmis au callback on_finish.
+    """
+    returncode: Optional[int]
+    wall_time: float
+    rusage: Optional[resource.struct_rusage] = None  # Processus et descendants, None pour un processus adopté
+
+
+class AdoptedProcess:
+    """
+    Processus démarré par une instance précédente de l'API et repris après son redémarrage.
+    N'étant pas un enfant du processus courant, son code de retour n'est pas disponible.
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.returncode: Optional[int] = None
+
+    def is_running(self) -> bool:
+        """
+        Vérifie si le processus est toujours en cours d'exécution.
+        """
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def matches(self, cwd: str, *arguments: str) -> bool:
+        """
+        Vérifie via /proc que le PID n'a pas été réutilisé par un autre processus depuis l'enregistrement de la job.
+        :param cwd: Dossier de travail attendu du processus
+        :param arguments: Arguments attendus dans la ligne de commande du processus
+        """
+        try:
+            with open(f'/proc/{self.pid}/cmdline', 'rb') as cmdline_file:
+                cmdline = cmdline_file.read().decode('utf-8', errors='replace').split('\0')
+            process_cwd = os.readlink(f'/proc/{self.pid}/cwd')
+        except OSError:
+            return False
+        return process_cwd == os.path.realpath(cwd) and \
+            all(any(argument in part for part in cmdline) for argument in arguments)
+
+    def wait(self) -> Optional[int]:
+        """
+        Attend la fin du processus, par scrutation.
+        """
+        while self.is_running():
+            time.sleep(TAIL_INTERVAL)
+        return self.returncode
+
+
+class LogReader:
+    """
+    Lecteur du fichier de sortie d'un processus, ligne par ligne, au fur et à mesure de son écriture (tail).
+    La sortie est écrite dans un fichier plutôt qu'un pipe, afin que le processus survive à un redémarrage de l'API.
+    """
+
+    def __init__(self, path: str, on_line: Callable[[str], None]):
+        """
+        :param path: Fichier de sortie du processus
+        :param on_line: Fonction à appeler pour chaque ligne lue, qui doit être rapide
+        """
+        self.on_line = on_line
+        self._file = open(path, 'rb')  # pylint: disable=consider-using-with
+        self._buffer = b''
+
+    def read(self):
+        """
+        Lit les lignes écrites depuis la lecture précédente, sans bloquer.
+        """
+        while True:
+            data = self._file.read(65536)
+            if not data:
+                return
+            *lines, self._buffer = (self._buffer + data).split(b'\n')
+            for line in lines:
+                self.on_line(line.decode('utf-8', errors='replace').rstrip('\r'))
+
+    def close(self):
+        """
+        Lit la fin du fichier, y compris une dernière ligne incomplète, puis le ferme.
+        """
+        self.read()
+        if self._buffer:
+            self.on_line(self._buffer.decode('utf-8', errors='replace'))
+            self._buffer = b''
+        self._file.close()
+
+
+class ProcessReaper(Thread):
+    """
+    Thread unique surveillant plusieurs processus à la fois.
+    Chaque processus est représenté par un pidfd (Linux >= 5.3), qui devient lisible lorsque le processus se termine :
+    le thread est bloqué dans select() et ne consomme aucune ressource entre deux événements.
+    Les fichiers de sortie des processus sont lus par le même thread, toutes les TAIL_INTERVAL secondes.
+    """
+
+    def __init__(self):
+        super().__init__(name='process-reaper', daemon=True)
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ)
+        self._pending: List[Tuple[int, 'WatchProcess']] = []
+        self._lock = Lock()
+        self._tailed: List['WatchProcess'] = []
+
+    def watch(self, pidfd: int, watcher: 'WatchProcess'):
+        """
+        Ajoute un processus à surveiller.
+        :param pidfd: File descriptor obtenu via os.pidfd_open
+        :param watcher: Job à terminer lorsque le processus se termine
+        """
+        with self._lock:
+            self._pending.append((pidfd, watcher))
+        os.write(self._wakeup_write, b'\0')  # Réveille le select() pour enregistrer le pidfd
+
+    def run(self):
+        while True:
+            for key, _ in self._selector.select(timeout=TAIL_INTERVAL if self._tailed else None):
+                if key.fd == self._wakeup_read:
+                    os.read(self._wakeup_read, 512)
+                    with self._lock:
+                        pending, self._pending = self._pending, []
+                    for pidfd, watcher in pending:
+                        self._selector.register(pidfd, selectors.EVENT_READ, watcher)
+                        if watcher.log_reader is not None:
+                            self._tailed.append(watcher)
+                else:
+                    self._selector.unregister(key.fd)
+                    os.close(key.fd)
+                    key.data.reap()  # Le processus est terminé, ne fait que récupérer son code de retour
+                    if key.data.log_reader is not None:
+                        self._tailed.remove(key.data)
+                        key.data.log_reader.close()
+                    # Le callback peut être long (post-traitement), il ne doit pas bloquer la surveillance des autres
+                    Thread(target=key.data.finish).start()
+            for watcher in self._tailed:
+                watcher.log_reader.read()
+
+
+_REAPER: Optional[ProcessReaper] = None
+_REAPER_LOCK = Lock()
+
+
+def get_reaper() -> ProcessReaper:
+    """
+    Obtient le thread de surveillance partagé, en le démarrant au premier appel.
+    """
+    global _REAPER  # pylint: disable=global-statement
+    with _REAPER_LOCK:
+        if _REAPER is None:
+            _REAPER = ProcessReaper()
+            _REAPER.start()
+        return _REAPER
+
+
+class WatchProcess:
     """
     Job permettant de surveiller un processus et de détecter la fin d'exécution.
-    Hérite de Thread, afin d'offrir des méthodes comme .start() et de directement pouvoir être exécuté en background.
-    ATTENTION, ce thread consomme présentement beaucoup de ressources puisque la boucle n'a pas de sleep.
+    La détection est événementielle : un seul thread partagé surveille tous les processus via pidfd.
+    Si pidfd n'est pas disponible, un thread attendant la fin du processus est utilisé pour ce processus.
     """
 
-    def __init__(self, process: Popen[bytes], on_finish: Callable, args):
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(self, process: Union[Popen, AdoptedProcess], on_finish: Callable[[Any, ProcessResult], None], args,
+                 on_output: Optional[Callable[[Any, str], None]] = None, log_path: Optional[str] = None,
+                 elapsed: float = 0.0):
         """
         Initialiser la job.
-        :param process: Processus à surveiller, de type Popen
-        :param on_finish: Fonction à appeler lorsque le processus est terminé
+        :param process: Processus à surveiller, de type Popen, ou AdoptedProcess s'il n'est pas un enfant
+        :param on_finish: Fonction à appeler lorsque le processus est terminé, avec args et un ProcessResult
+        :param args: Argument transmis au callback
+        :param on_output: Fonction à appeler pour chaque ligne du fichier de sortie log_path, avec args et la ligne
+        :param log_path: Fichier de sortie du processus
+        :param elapsed: Durée d'exécution du processus avant le début de la surveillance
         """
         self.process = process
         self.on_finish = on_finish
         self.args = args
-        super().__init__(target=self._task)
+        self.started_at = time.monotonic() - elapsed
+        self.rusage: Optional[resource.struct_rusage] = None
+        self.log_reader = None
+        if on_output is not None and log_path is not None:
+            self.log_reader = LogReader(log_path, lambda line: on_output(self.args, line))
+
+    def start(self):
+        """
+        Démarre la surveillance du processus.
+        """
+        try:
+            pidfd = os.pidfd_open(self.process.pid)
+        except ProcessLookupError:
+            self._finish_now()
+            return
+        except (AttributeError, OSError):
+            Thread(target=self._wait).start()
+            return
+        get_reaper().watch(pidfd, self)
+
+    def _finish_now(self):
+        """
+        Le processus (adopté) est déjà terminé.
+        """
+        if self.log_reader is not None:
+            self.log_reader.close()
+        Thread(target=self.finish).start()
+
+    def _wait(self):
+        if self.log_reader is not None:
+            while self._is_running():
+                self.log_reader.read()
+                time.sleep(TAIL_INTERVAL)
+        self.reap()
+        if self.log_reader is not None:
+            self.log_reader.close()
+        self.finish()
+
+    def _is_running(self) -> bool:
+        if isinstance(self.process, AdoptedProcess):
+            return self.process.is_running()
+        # WNOWAIT : le processus n'est pas récupéré, afin que reap() obtienne sa consommation de ressources
+        return os.waitid(os.P_PID, self.process.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is None
+
+    def reap(self):
+        """
+        Attend la fin du processus, puis récupère son code de retour et sa consommation de ressources.
+        """
+        if isinstance(self.process, AdoptedProcess):
+            self.process.wait()
+            return
+        try:
+            _, status, self.rusage = os.wait4(self.process.pid, 0)
+            self.process.returncode = os.waitstatus_to_exitcode(status)
+        except ChildProcessError:  # Déjà récupéré
+            self.process.wait()
 
-    def _task(self):
+    def finish(self):
         """
-        Lors du démarrage de la job.
+        Appelle le callback avec le code de retour et la durée d'exécution du processus.
         """
-        while self.process is not None:  # Tant que le processus existe
-            if self.process.poll() is not None:  # Vérification de l'état du processus
-                self.process = None  # On détruit le processus (seulement en référence)
-                self.on_finish(self.args)  # On appelle le callback
+        self.on_finish(self.args, ProcessResult(returncode=self.process.returncode,
+                                                wall_time=time.monotonic() - self.started_at, rusage=self.rusage))
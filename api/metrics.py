@@ -0,0 +1,129 @@
+"""
+Métriques Prometheus de l'API, exposées via /metrics.
+Les métriques sont des compteurs et histogrammes en mémoire (quelques microsecondes par observation), et l'état des
+jobs n'est calculé qu'au moment de la collecte : elles peuvent rester activées en production.
+"""
+
+import time
+from typing import Dict
+
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+
+# Durées longues : de quelques secondes (file d'attente vide) à plusieurs heures (fuzz)
+JOB_BUCKETS = (1, 5, 15, 60, 300, 900, 1800, 3600, 7200, 14400, 28800, 86400)
+FINDINGS_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+
+# Actions de wordpress.org suivies individuellement, les autres sont regroupées sous "other"
+WORDPRESS_ACTIONS = ('query_plugins', 'plugin_information')
+
+REQUEST_DURATION = Histogram('api_request_duration_seconds',
+                             'Latency of API requests, until the response headers are sent',
+                             ['router', 'method', 'status'])
+OUTBOUND_DURATION = Histogram('wordpress_org_request_duration_seconds',
+                              'Latency of requests to wordpress.org, until the response headers are received',
+                              ['action', 'status'])
+OUTBOUND_ERRORS = Counter('wordpress_org_request_errors_total',
+                          'Failed requests to wordpress.org: transport errors and 5xx/429 responses',
+                          ['action', 'error'])
+JOB_STAGE_DURATION = Histogram('fuzz_job_stage_duration_seconds',
+                               'Duration of each stage of the fuzz jobs: queue, fuzz and processing',
+                               ['stage'], buckets=JOB_BUCKETS)
+JOBS_COMPLETED = Counter('fuzz_jobs_completed_total', 'Fuzz jobs completed, by result', ['result'])
+FINDINGS_STAGE_DURATION = Histogram('print_findings_stage_duration_seconds',
+                                    'Time spent by print_findings.py in each stage: list, analyze, archive and write',
+                                    ['stage'], buckets=FINDINGS_BUCKETS)
+
+
+def status_class(status_code: int) -> str:
+    """
+    Regroupe les codes de statut HTTP par classe (2xx, 4xx...), afin de borner le nombre de séries.
+    """
+    return f'{status_code // 100}xx'
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI mesurant la latence des requêtes par router.
+    La durée est mesurée jusqu'à l'envoi des headers de la réponse : pour un flux (NDJSON, Server-Sent Events), elle
+    ne comprend pas la durée de la diffusion.
+    """
+
+    def __init__(self, app, routers: Dict[str, str]):
+        """
+        :param app: Application ASGI
+        :param routers: Nom de chaque router, par préfixe (ex. {'/status': 'api_status'})
+        """
+        self.app = app
+        self.routers = routers
+
+    def get_router(self, path: str) -> str:
+        """
+        Obtient le nom du router d'une requête, "other" si aucun router ne correspond.
+        """
+        for prefix, name in self.routers.items():
+            if path == prefix or path.startswith(prefix + '/'):
+                return name
+        return 'other'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        observed = False
+
+        def observe(status_code: int):
+            nonlocal observed
+            observed = True
+            REQUEST_DURATION.labels(self.get_router(scope['path']), scope['method'],
+                                    status_class(status_code)).observe(time.perf_counter() - started)
+
+        async def send_with_metrics(message):
+            if message['type'] == 'http.response.start':
+                observe(message['status'])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            if not observed:
+                observe(500)
+
+
+class SchedulerCollector:  # pylint: disable=too-few-public-methods
+    """
+    Collecteur de l'état des jobs de l'ordonnanceur, calculé à chaque collecte.
+    """
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    def collect(self):
+        """
+        Obtient les gauges des jobs par état, de la file d'attente et des workers.
+        """
+        jobs = GaugeMetricFamily('fuzz_jobs', 'Fuzz jobs, by state', labels=['state'])
+        for state, count in self.scheduler.count_jobs().items():
+            jobs.add_metric([state.lower()], count)
+        yield jobs
+        yield GaugeMetricFamily('fuzz_queue_depth', 'Fuzz jobs waiting for a worker',
+                                value=len(self.scheduler.queued_jobs()))
+        yield GaugeMetricFamily('fuzz_workers', 'Maximum number of simultaneous fuzzes',
+                                value=self.scheduler.max_workers)
+
+
+def register_scheduler(scheduler):
+    """
+    Expose l'état des jobs d'un ordonnanceur.
+    """
+    REGISTRY.register(SchedulerCollector(scheduler))
+
+
+def observe_findings_timings(timings: Dict[str, float]):
+    """
+    Enregistre les durées des étapes de print_findings.py (--timings-file).
+    """
+    for stage, seconds in timings.items():
+        FINDINGS_STAGE_DURATION.labels(stage).observe(seconds)
@@ -0,0 +1,60 @@
+import gzip
+import os
+import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ReportArchiver:
+    """
+    Compresses clean reports in-process on background threads, off the analysis critical path.
+    Reports are either compressed one by one next to each other (<name>.gz, as `gzip` did), or
+    appended to a single zip bundle, which avoids creating thousands of small files.
+    """
+
+    def __init__(self, level: int = 6, bundle_path: str = None, workers: int = 4):
+        self._level = level
+        self._bundle = None
+        if bundle_path:
+            os.makedirs(os.path.dirname(os.path.abspath(bundle_path)), exist_ok=True)
+            self._bundle = zipfile.ZipFile(
+                bundle_path,
+                "a",
+                compression=zipfile.ZIP_DEFLATED,
+                compresslevel=level,
+                strict_timestamps=False,
+            )
+            workers = 1  # Appends to a zip file must be serialized
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._futures = []
+
+    def archive(self, file_path: str):
+        self._futures.append(self._executor.submit(self._archive, file_path))
+
+    def _archive(self, file_path: str):
+        if self._bundle is not None:
+            self._bundle.write(file_path, os.path.basename(file_path))
+        else:
+            with open(file_path, "rb") as src, open(file_path + ".gz", "wb") as raw:
+                with gzip.GzipFile(
+                    os.path.basename(file_path),
+                    "wb",
+                    compresslevel=self._level,
+                    fileobj=raw,
+                    mtime=int(os.fstat(src.fileno()).st_mtime),
+                ) as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+        os.remove(file_path)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        if self._bundle is not None:
+            self._bundle.close()
+        for future in self._futures:
+            future.result()  # Re-raise archiving errors
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
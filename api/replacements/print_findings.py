@@ -1,9 +1,12 @@
 import binascii
+import hashlib
 import json
 import os
 import re
-import subprocess
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 
 import termcolor
 import typer
@@ -12,10 +15,149 @@ from tqdm import tqdm
 import crash_detector
 import filtering
 import fuzzer_output_regexes
+from archiving import ReportArchiver
+from result_reader import command_output, iter_result_file
+
+
+# Markers stripped from the output, in the order they used to be removed. They are fused into a
+# single alternation, one named group per marker, so that one scan classifies and strips them all.
+#
+# The fused scan only gives the same result as one scan per marker when markers do not overlap:
+# separate scans find a marker nested in another one (e.g. an intercept inside a call), and the
+# sequential substitutions strip the inner marker first. Outputs where a marker starts inside
+# another one, and patterns with backreferences (whose group numbers shift once fused), go through
+# the separate scans instead.
+MARKER_NAMES = (
+    "NOT_IMPLEMENTED_RE",
+    "INTERCEPT_RE",
+    "COULD_AS_WELL_BE_EQUAL_RE",
+    "CALL_RE",
+    "HEADER_RE",
+)
+SCOPED_FLAGS = (("a", re.ASCII), ("i", re.IGNORECASE), ("m", re.MULTILINE), ("s", re.DOTALL), ("x", re.VERBOSE))
+BACKREFERENCE_RE = re.compile(r"\\[1-9]|\(\?P=")
+
+
+def marker_patterns():
+    return {name: re.compile(getattr(fuzzer_output_regexes, name)) for name in MARKER_NAMES}
+
+
+def literal_prefix(patterns) -> str:
+    # re only searches for a literal prefix quickly when the whole pattern starts with it, which an
+    # alternation does not: the prefix shared by every marker (e.g. "__GARLIC_") is factored out.
+    if any(pattern.flags & (re.IGNORECASE | re.VERBOSE) for pattern in patterns):
+        return ""
+    prefix = re.match(r"\w*", os.path.commonprefix([pattern.pattern for pattern in patterns])).group()
+    # The last character stays in the alternatives if a quantifier applies to it
+    while prefix and any(pattern.pattern[len(prefix):len(prefix) + 1] in ("*", "+", "?", "{") for pattern in patterns):
+        prefix = prefix[:-1]
+    return prefix
+
+
+def compile_markers_re():
+    prefix = MARKERS_PREFIX
+    alternatives = []
+    for name, pattern in MARKER_RES.items():
+        if BACKREFERENCE_RE.search(pattern.pattern):
+            return None
+        flags = "".join(letter for letter, flag in SCOPED_FLAGS if pattern.flags & flag)
+        body = pattern.pattern[len(prefix):]
+        body = f"(?{flags}:{body})" if flags else body
+        alternatives.append(f"(?P<{name}>{body})")
+    return re.compile(f"{prefix}(?:{'|'.join(alternatives)})")
+
+
+MARKER_RES = marker_patterns()
+MARKERS_PREFIX = literal_prefix(MARKER_RES.values())
+MARKERS_RE = compile_markers_re()
+
+
+class OverlappingMarkers(Exception):
+    pass
+
+
+def marker_group(match, name: str, group: int) -> str:
+    # Group `group` of marker `name` is numbered right after the marker's own named group.
+    return match.group(MARKERS_RE.groupindex[name] + group)
+
+
+def format_intercept(value: str) -> str:
+    intercepted_variable_info = json.loads(value)
+    return (
+        f"{intercepted_variable_info['name']}"
+        f"[{intercepted_variable_info['key']}] = "
+        f"{intercepted_variable_info['payload']}"
+    )
+
+
+def format_could_as_well_be_equal(left: str, right: str) -> str:
+    return (
+        "May as well be equal: "
+        + binascii.unhexlify(left).decode("ascii", "ignore")
+        + " and "
+        + binascii.unhexlify(right).decode("ascii", "ignore")
+    )
+
+
+def tokenize_markers(output: str):
+    """
+    Strips the fuzzer markers from an output.
+    Returns the stripped output, the intercepted variables, and the call and header markers.
+    """
+    if MARKERS_RE is not None:
+        try:
+            return tokenize_markers_fused(output)
+        except OverlappingMarkers:
+            pass
+    return tokenize_markers_separately(output)
+
+
+def tokenize_markers_fused(output: str):
+    intercepts = []
+    could_as_well_be_equal = []
+    call_matches = []
+    header_matches = []
+
+    def strip_marker(match):
+        # Every marker starts with the prefix: only a match containing it again may contain another marker.
+        start, end = match.span()
+        if not MARKERS_PREFIX or output.find(MARKERS_PREFIX, start + 1, end) != -1:
+            next_marker = MARKERS_RE.search(output, start + 1)
+            if next_marker is not None and next_marker.start() < end:
+                raise OverlappingMarkers()
+        name = match.lastgroup
+        if name == "INTERCEPT_RE":
+            intercepts.append(format_intercept(marker_group(match, name, 1)))
+        elif name == "COULD_AS_WELL_BE_EQUAL_RE":
+            could_as_well_be_equal.append(
+                format_could_as_well_be_equal(marker_group(match, name, 1), marker_group(match, name, 2))
+            )
+        elif name == "CALL_RE":
+            call_matches.append(marker_group(match, name, 1))
+        elif name == "HEADER_RE":
+            header_matches.append(marker_group(match, name, 1))
+        return ""
+
+    output = MARKERS_RE.sub(strip_marker, output)
+    return output, intercepts + could_as_well_be_equal, call_matches, header_matches
+
+
+def tokenize_markers_separately(output: str):
+    # One scan per marker on the original output, then one substitution per marker in order.
+    intercepts = [format_intercept(match.group(1)) for match in MARKER_RES["INTERCEPT_RE"].finditer(output)]
+    could_as_well_be_equal = [
+        format_could_as_well_be_equal(match.group(1), match.group(2))
+        for match in MARKER_RES["COULD_AS_WELL_BE_EQUAL_RE"].finditer(output)
+    ]
+    call_matches = [match.group(1) for match in MARKER_RES["CALL_RE"].finditer(output)]
+    header_matches = [match.group(1) for match in MARKER_RES["HEADER_RE"].finditer(output)]
+    for name in MARKER_NAMES:
+        output = MARKER_RES[name].sub("", output)
+    return output, intercepts + could_as_well_be_equal, call_matches, header_matches
 
-output_text = {}
-output_text['header'] = ""
-output_text['data'] = []
+
+def new_output_text():
+    return {"header": "", "data": [], "suppressed_duplicates": {}}
 
 
 def trim_if_too_long(data: str, max_length: int = 2000):
@@ -25,10 +167,23 @@ def trim_if_too_long(data: str, max_length: int = 2000):
         return data
 
 
+def finding_digest(data) -> bytes:
+    # Call findings are dicts: hash their canonical JSON. The type prefix keeps a text finding
+    # from colliding with a dict finding serialized to the same text.
+    if isinstance(data, dict):
+        canonical = "d:" + json.dumps(data, sort_keys=True, separators=(",", ":"))
+    else:
+        canonical = "s:" + data
+    return hashlib.blake2b(
+        canonical.encode("utf-8", "surrogatepass"), digest_size=16
+    ).digest()
+
+
 class FindingsPrinter:
-    def __init__(self):
+    def __init__(self, output_text):
+        self._output_text = output_text
         self._header_printed = None
-        self._already_printed = []
+        self._already_printed = set()
 
     def print_findings(
         self,
@@ -38,32 +193,12 @@ class FindingsPrinter:
         file_or_action: str,
         with_color: bool,
     ) -> bool:
-        intercepted_variables_info = []
-        for match in fuzzer_output_regexes.INTERCEPT_RE.finditer(output):
-            intercepted_variable_info = json.loads(match.group(1))
-            intercepted_variable_info_as_string = (
-                f"{intercepted_variable_info['name']}"
-                f"[{intercepted_variable_info['key']}] = "
-                f"{intercepted_variable_info['payload']}"
-            )
-            intercepted_variables_info.append(intercepted_variable_info_as_string)
-
-        for match in fuzzer_output_regexes.COULD_AS_WELL_BE_EQUAL_RE.finditer(output):
-            intercepted_variables_info.append(
-                "May as well be equal: "
-                + binascii.unhexlify(match.group(1)).decode("ascii", "ignore")
-                + " and "
-                + binascii.unhexlify(match.group(2)).decode("ascii", "ignore")
-            )
-
-        call_matches = list(fuzzer_output_regexes.CALL_RE.finditer(output))
-        header_matches = list(fuzzer_output_regexes.HEADER_RE.finditer(output))
-
-        output = re.sub(fuzzer_output_regexes.NOT_IMPLEMENTED_RE, "", output)
-        output = re.sub(fuzzer_output_regexes.INTERCEPT_RE, "", output)
-        output = re.sub(fuzzer_output_regexes.COULD_AS_WELL_BE_EQUAL_RE, "", output)
-        output = re.sub(fuzzer_output_regexes.CALL_RE, "", output)
-        output = re.sub(fuzzer_output_regexes.HEADER_RE, "", output)
+        (
+            output,
+            intercepted_variables_info,
+            call_matches,
+            header_matches,
+        ) = tokenize_markers(output)
         output = filtering.filter_false_positives(
             output, file_or_action, fuzzer_output_path
         )
@@ -82,17 +217,23 @@ class FindingsPrinter:
         matchers = crash_detector.get_matchers(in_admin_or_profile)
         to_print = []
 
+        # Each matcher keeps its next match at or after `position` until that match is consumed or
+        # skipped over, so the output is scanned once with `pos` offsets instead of being re-searched
+        # and re-sliced after every finding. Contexts are taken from the original buffer, never
+        # reaching back before the end of the previous finding.
+        next_matches = [matcher.search(output) for matcher in matchers]
+        position = 0
         while True:
             min_match = None
-            min_match_position = None
-            for matcher in matchers:
-                match = matcher.search(output)
+            for i, matcher in enumerate(matchers):
+                match = next_matches[i]
+                if match is not None and match.start() < position:
+                    match = next_matches[i] = matcher.search(output, position)
                 if not match:
                     continue
 
-                if min_match_position is None or min_match_position > match.start():
+                if min_match is None or min_match.start() > match.start():
                     min_match = match
-                    min_match_position = match.start()
 
             if min_match is None:
                 break
@@ -100,23 +241,17 @@ class FindingsPrinter:
             match_position = min_match.start()
             match_size = min(max_match_size, min_match.end() - min_match.start())
 
-            match = output[match_position : match_position + match_size]
-            left_context = output[max(0, match_position - lcontext) : match_position]
-            right_context = output[
-                match_position
-                + match_size : min(len(output), match_position + match_size + rcontext)
+            data = output[
+                max(position, match_position - lcontext) : match_position
+                + match_size
+                + rcontext
             ]
-            data = (
-                left_context
-                + match
-                + right_context
-            )
 
             to_print.append(data)
-            output = output[match_position + match_size :]
+            position = match_position + match_size
 
         for match in header_matches:
-            header = binascii.unhexlify(match.group(1)).decode("ascii", "ignore")
+            header = binascii.unhexlify(match).decode("ascii", "ignore")
 
             if filtering.is_header_interesting(
                 header, fuzzer_output_path, file_or_action
@@ -124,7 +259,7 @@ class FindingsPrinter:
                 to_print.append(f"Header: {header}")
 
         for match in call_matches:
-            call_information = json.loads(match.group(1))
+            call_information = json.loads(match)
             if filtering.is_call_interesting(
                 call_information,
                 in_admin_or_profile,
@@ -141,113 +276,308 @@ class FindingsPrinter:
         for data in to_print:
             data = trim_if_too_long(data)
 
-            if data in self._already_printed:
+            digest = finding_digest(data)
+            if digest in self._already_printed:
+                suppressed = self._output_text['suppressed_duplicates'].setdefault(fuzzer_output_path, {})
+                suppressed[file_or_action] = suppressed.get(file_or_action, 0) + 1
                 continue
-            self._already_printed.append(data)
+            self._already_printed.add(digest)
 
             if self._header_printed != file_or_action:
                 self._header_printed = file_or_action
-                output_text['header'] = "{} ({} active installs) {}".format(fuzzer_output_path, active_installs, file_or_action)
-            output_text['data'].append({
+                self._output_text['header'] = "{} ({} active installs) {}".format(fuzzer_output_path, active_installs, file_or_action)
+            self._output_text['data'].append({
                 "data": data,
-                "intercepted_variables_info": trim_if_too_long("&".join(intercepted_variables_info))
+                "intercepted_variables_info": trim_if_too_long("&".join(intercepted_variables_info)),
+                "file_path": fuzzer_output_path,
+                "file_or_action": file_or_action,
             })
         return len(to_print) > 0
 
 
-def print_findings_from_folder(
-    output_folder: str,
-    min_active_installs: int = typer.Option(0),
-    show_only_paths_containing: str = typer.Option(None),
-):
-    file_names = []
-    for file_name in os.listdir(output_folder):
-        if file_name.endswith(".json"):
-            file_names.append(file_name)
-
-    os.makedirs(os.path.join(output_folder, "scanned"), exist_ok=True)
-
-    if show_only_paths_containing:
-        file_names = [
-            file_name
-            for file_name in file_names
-            if show_only_paths_containing in file_name
-        ]
-
-    file_names = list(
-        reversed(
-            sorted(
-                file_names,
-                key=lambda file_name: os.path.getmtime(
-                    os.path.join(output_folder, file_name)
-                ),
-            )
+def print_commands_findings(findings_printer, commands, file_path: str, active_installs) -> bool:
+    anything_printed = False
+    for command in commands:
+        anything_printed |= findings_printer.print_findings(
+            command_output(command),
+            file_path,
+            active_installs,
+            command["object_name"],
+            with_color=False,
         )
-    )
+    return anything_printed
+
+
+def analyze_file(file_path: str, min_active_installs: int):
+    # Runs in a worker process: returns this file's own output_text, or None when the file is
+    # skipped, so that results can be merged in order by the parent process.
+    # The file is streamed: commands are analyzed one at a time as they are decoded.
+    file_output_text = new_output_text()
+    file_output_text["anything_printed"] = False
+    findings_printer = FindingsPrinter(file_output_text)
+
+    results = {}
+    commands_skipped = False
+    with open(file_path, "r") as f:
+        for key, value in iter_result_file(f):
+            if key != "command_results":
+                results[key] = value
+            elif "active_installs" in results:
+                if int(results["active_installs"]) < min_active_installs:
+                    return None
+                file_output_text["anything_printed"] = print_commands_findings(
+                    findings_printer, value, file_path, results["active_installs"]
+                )
+            else:
+                # active_installs comes after the commands: they are skipped for now and
+                # analyzed in a second pass, once the file is known not to be filtered out.
+                commands_skipped = True
+
+    if int(results.get("active_installs", 0)) < min_active_installs:
+        return None
 
+    if commands_skipped:
+        with open(file_path, "r") as f:
+            for key, value in iter_result_file(f):
+                if key == "command_results":
+                    file_output_text["anything_printed"] = print_commands_findings(
+                        findings_printer, value, file_path, results["active_installs"]
+                    )
+                    break
+
+    return file_output_text
+
+
+# Returned instead of a file's output_text when the file is still being written by the fuzzer.
+INCOMPLETE = "incomplete"
+
+
+def analyze_file_if_complete(file_path: str, min_active_installs: int):
+    try:
+        return analyze_file(file_path, min_active_installs)
+    except ValueError:
+        return INCOMPLETE
+
+
+def merge_file_results(file_results, output_folder: str, archiver=None):
+    # file_results yields (file_name, file_path, file_output_text) in mtime order. Clean reports are
+    # archived on the way when an archiver is given.
+    num_paths = 0
     num_paths_with_printed_reports = 0
 
-    use_console_features = sys.stdout.isatty()
+    output_text = new_output_text()
 
-    for file_name in tqdm(file_names) if use_console_features else file_names:
-        file_path = os.path.join(output_folder, file_name)
+    for file_name, file_path, file_output_text in file_results:
+        num_paths += 1
         output_text['file_path'] = file_path
-        with open(file_path, "r") as f:
-            if os.fstat(f.fileno()).st_size == 0:
-                results = {}
-            else:
-                results = json.load(f)
-
-        if int(results.get("active_installs", 0)) < min_active_installs:
+        if file_output_text is None:
             continue
 
-        anything_printed = False
-
-        if "command_results" in results:
-            findings_printer = FindingsPrinter()
-            for command in results["command_results"]:
-                if "output" not in command:
-                    command["output"] = ""
-                if "stdout" not in command:
-                    command["stdout"] = ""
-                if "stderr" not in command:
-                    command["stderr"] = ""
-
-                anything_printed |= findings_printer.print_findings(
-                    (command["output"] + command["stdout"] + command["stderr"])
-                    .replace("\n", " ")
-                    .replace("\r", " "),
-                    file_path,
-                    results["active_installs"],
-                    command["object_name"],
-                    with_color=False,
-                )
+        if file_output_text['header']:
+            output_text['header'] = file_output_text['header']
+        output_text['data'].extend(file_output_text['data'])
+        output_text['suppressed_duplicates'].update(file_output_text['suppressed_duplicates'])
 
-        if anything_printed:
+        if file_output_text['anything_printed']:
             num_paths_with_printed_reports += 1
         else:
             output_text['nothing_found'] = f"Nothing found in {file_name}. Archiving the report..."
-            os.rename(
-                os.path.join(output_folder, file_name),
-                os.path.join(output_folder, "scanned", file_name),
-            )
-            subprocess.call(
-                [
-                    "gzip",
-                    "-v9",
-                    os.path.join(output_folder, "scanned", file_name),
-                ]
-            )
+            if archiver is not None:
+                archive_report(output_folder, file_name, archiver)
 
-    output_text['filepaths_total'] = f"Unique filepaths total: {len(file_names)}"
+    output_text['filepaths_total'] = f"Unique filepaths total: {num_paths}"
 
-    if len(file_names) == 0:
+    if num_paths == 0:
         output_text['no_report'] = "No reports to print. Maybe all have been archived?"
     else:
-        output_text['summary'] = f"Filepaths with report printed: {num_paths_with_printed_reports} " + f"({100.0 * num_paths_with_printed_reports / len(file_names):.02f}%)"
+        output_text['summary'] = f"Filepaths with report printed: {num_paths_with_printed_reports} " + f"({100.0 * num_paths_with_printed_reports / num_paths:.02f}%)"
+
+    return output_text
+
+
+def archive_report(output_folder: str, file_name: str, archiver):
+    os.rename(
+        os.path.join(output_folder, file_name),
+        os.path.join(output_folder, "scanned", file_name),
+    )
+    archiver.archive(os.path.join(output_folder, "scanned", file_name))
 
-    with open("data/output.json", "w") as f:
+
+@contextmanager
+def timed(timings, stage: str):
+    # Accumulates the wall time spent in a stage, for --timings-file. A no-op when timings is None.
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+def write_output(output_text, path: str = "data/output.json"):
+    # Written to a temporary file first, so that readers never see a half-written output.
+    with open(path + ".tmp", "w") as f:
         json.dump(output_text, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+def follow_folder(
+    output_folder: str,
+    min_active_installs: int,
+    show_only_paths_containing: str,
+    executor,
+    archiver,
+    stop_file: str,
+    poll_interval: float,
+    settle_time: float = 2.0,
+    timings=None,
+):
+    # Analyzes result files as soon as the fuzzer has written them, and rewrites a partial
+    # output.json after each batch. Once the stop file exists (the fuzzer has exited), the remaining
+    # files are analyzed and the final output.json is identical to a single run over the folder.
+    results = {}  # file_name -> (mtime, file_output_text)
+    while True:
+        stopping = os.path.exists(stop_file)
+        now = time.time()
+        new_files = []
+        with timed(timings, "list"), os.scandir(output_folder) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json") or entry.name in results:
+                    continue
+                if show_only_paths_containing and show_only_paths_containing not in entry.name:
+                    continue
+                mtime = entry.stat().st_mtime
+                if stopping or now - mtime >= settle_time:
+                    new_files.append((entry.name, mtime))
+
+        file_paths = [os.path.join(output_folder, file_name) for file_name, _ in new_files]
+        analyze = analyze_file if stopping else analyze_file_if_complete
+        if executor is None:
+            file_results = map(analyze, file_paths, [min_active_installs] * len(file_paths))
+        else:
+            file_results = executor.map(analyze, file_paths, [min_active_installs] * len(file_paths))
+
+        with timed(timings, "analyze"):
+            for (file_name, mtime), file_output_text in zip(new_files, file_results):
+                if file_output_text == INCOMPLETE:
+                    continue  # Retried at the next poll
+                results[file_name] = (mtime, file_output_text)
+                if file_output_text is not None and not file_output_text['anything_printed']:
+                    archive_report(output_folder, file_name, archiver)
+
+        if new_files or stopping:
+            with timed(timings, "analyze"):
+                ordered = sorted(results.items(), key=lambda item: item[1][0], reverse=True)
+                output_text = merge_file_results(
+                    ((file_name, os.path.join(output_folder, file_name), file_output_text)
+                     for file_name, (_, file_output_text) in ordered),
+                    output_folder,
+                )
+            if not stopping:
+                output_text['partial'] = True
+            with timed(timings, "write"):
+                write_output(output_text)
+
+        if stopping:
+            return
+        time.sleep(poll_interval)
+
+
+def print_findings_from_folder(
+    output_folder: str,
+    min_active_installs: int = typer.Option(0),
+    show_only_paths_containing: str = typer.Option(None),
+    jobs: int = typer.Option(1, "--jobs", "-j", help="Number of files analyzed in parallel, 0 for all cores."),
+    archive_level: int = typer.Option(6, min=0, max=9, help="Compression level of archived clean reports."),
+    archive_bundle: str = typer.Option(
+        None, help="Append clean reports to this zip file instead of gzipping each one."
+    ),
+    follow: bool = typer.Option(
+        False, help="Analyze result files as the fuzzer writes them, until --stop-file exists."
+    ),
+    stop_file: str = typer.Option("data/fuzz_done", help="File created once the fuzzer has exited."),
+    poll_interval: float = typer.Option(5.0, help="Seconds between two scans of the folder in --follow mode."),
+    timings_file: str = typer.Option(
+        None, help="Write the seconds spent in each stage (list, analyze, archive, write) to this JSON file."
+    ),
+):
+    # Kept out of output.json, so that the output stays identical whatever the mode and --jobs are.
+    timings = {} if timings_file else None
+    if follow:
+        os.makedirs(os.path.join(output_folder, "scanned"), exist_ok=True)
+        executor = ProcessPoolExecutor(jobs or None) if jobs != 1 else None
+        archiver = ReportArchiver(level=archive_level, bundle_path=archive_bundle)
+        try:
+            follow_folder(output_folder, min_active_installs, show_only_paths_containing,
+                          executor, archiver, stop_file, poll_interval, timings=timings)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            with timed(timings, "archive"):
+                archiver.close()
+        write_timings(timings, timings_file)
+        return
+
+    with timed(timings, "list"):
+        file_names = []
+        for file_name in os.listdir(output_folder):
+            if file_name.endswith(".json"):
+                file_names.append(file_name)
+
+        os.makedirs(os.path.join(output_folder, "scanned"), exist_ok=True)
+
+        if show_only_paths_containing:
+            file_names = [
+                file_name
+                for file_name in file_names
+                if show_only_paths_containing in file_name
+            ]
+
+        file_names = list(
+            reversed(
+                sorted(
+                    file_names,
+                    key=lambda file_name: os.path.getmtime(
+                        os.path.join(output_folder, file_name)
+                    ),
+                )
+            )
+        )
+        file_paths = [os.path.join(output_folder, file_name) for file_name in file_names]
+
+    use_console_features = sys.stdout.isatty()
+
+    executor = ProcessPoolExecutor(jobs or None) if jobs != 1 else None
+    archiver = ReportArchiver(level=archive_level, bundle_path=archive_bundle)
+    try:
+        # Both map() preserve the mtime order, so the merged output is identical whatever --jobs is.
+        if executor is None:
+            file_results = map(analyze_file, file_paths, [min_active_installs] * len(file_paths))
+        else:
+            file_results = executor.map(analyze_file, file_paths, [min_active_installs] * len(file_paths))
+        if use_console_features:
+            file_results = tqdm(file_results, total=len(file_paths))
+
+        # Files are analyzed lazily, as they are merged
+        with timed(timings, "analyze"):
+            output_text = merge_file_results(zip(file_names, file_paths, file_results), output_folder, archiver)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        with timed(timings, "archive"):
+            archiver.close()
+
+    with timed(timings, "write"):
+        write_output(output_text)
+    write_timings(timings, timings_file)
+
+
+def write_timings(timings, path: str):
+    if timings is not None:
+        with open(path, "w") as f:
+            json.dump({stage: round(seconds, 6) for stage, seconds in timings.items()}, f, indent=4)
 
 
 if __name__ == "__main__":
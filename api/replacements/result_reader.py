@@ -0,0 +1,120 @@
+import json
+
+CHUNK_SIZE = 1 << 20
+WHITESPACE = " \t\n\r"
+NUMBER_CHARS = "0123456789.eE+-"
+
+_decoder = json.JSONDecoder()
+
+
+class _JsonStream:
+    # Incremental reader over a text file: values are decoded with raw_decode() from a buffer that
+    # only holds the value being decoded, and that is refilled (doubling) when the value is incomplete.
+
+    def __init__(self, f):
+        self._f = f
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        # Drop what has already been consumed, then read at least as much as is pending, so that
+        # retrying an incomplete value costs amortized linear time.
+        self._buffer = self._buffer[self._pos :]
+        self._pos = 0
+        chunk = self._f.read(max(CHUNK_SIZE, len(self._buffer)))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer += chunk
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise json.JSONDecodeError(f"Expecting one of {chars!r}", self._buffer, self._pos)
+        self._pos += 1
+        return char
+
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number may continue in the next chunk: raw_decode() stops at "1." or "1.5e" when the
+            # fraction or exponent is cut off, so refill unless it is followed by another character.
+            if isinstance(value, (int, float)) and self._number_may_continue(end) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _number_may_continue(self, end: int) -> bool:
+        return end == len(self._buffer) or self._buffer[end] in NUMBER_CHARS
+
+    def iter_array(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self.decode()
+            if self.expect(",]") == "]":
+                return
+
+
+def iter_result_file(f):
+    """
+    Yields the top-level (key, value) pairs of a fuzzer result file, in file order.
+    The value of "command_results" is a generator yielding one command at a time: peak memory is
+    bounded by the largest command instead of the whole file. If it is not (fully) consumed, the
+    remaining commands are skipped before the next key is read.
+    """
+    stream = _JsonStream(f)
+    if not stream.peek():
+        return  # Empty file
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.decode()
+        stream.expect(":")
+        if key == "command_results":
+            commands = stream.iter_array()
+            yield key, commands
+            for _ in commands:
+                pass
+        else:
+            yield key, stream.decode()
+        if stream.expect(",}") == "}":
+            return
+
+
+NEWLINES_TO_SPACES = str.maketrans("\n\r", "  ")
+
+
+def command_output(command: dict) -> str:
+    """
+    Concatenates the output, stdout and stderr of a command with newlines replaced by spaces.
+    """
+    parts = [command.get(key) or "" for key in ("output", "stdout", "stderr")]
+    text = "".join(part for part in parts if part)  # No copy when a single part is present
+    # translate() makes a single copy of ASCII text but falls off CPython's fast path otherwise,
+    # where two replace() passes are much cheaper.
+    if text.isascii():
+        return text.translate(NEWLINES_TO_SPACES)
+    return text.replace("\n", " ").replace("\r", " ")
@@ -2,29 +2,30 @@
 Router : Status
 """
 from dataclasses import dataclass
-import subprocess
-from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
+
+from jobs.status_checks import StatusChecks
 
 router = APIRouter(prefix='/status', tags=['status'])
 
+router.status_checks = StatusChecks()
+
 
-def check_if_command_exists(command: [str]) -> bool:
+async def startup():
     """
-    Vérifie si une commande console existe.
-    ATTENTION, la commande est réellement exécutée, privilégier les commandes pour obtenir des versions,
-    qui n'affectent pas le système.
-    :param command: Commande à exécuter, sous forme d'array. Ex. ['ls', '-la']
-    :return: Vrai si la commande a pu être exécutée, faux si FileNotFoundError (commande inconnue)
+    Démarre le rafraîchissement des vérifications en background.
     """
-    try:
-        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT, check=False)
-    except FileNotFoundError:
-        return False
+    if router.status_checks.enabled:
+        router.status_checks.start()
+
 
-    return True
+async def shutdown():
+    """
+    Arrête le rafraîchissement des vérifications.
+    """
+    await router.status_checks.stop()
 
 
 @dataclass
@@ -34,17 +35,41 @@ class APIStatus:
     """
     checks: Dict[str, bool]
     result: bool
+    checked_at: Optional[float] = None
+
+
+async def get_api_status() -> APIStatus:
+    """
+    Obtient le dernier résultat des vérifications.
+    """
+    checks = await router.status_checks.get_checks()
+    return APIStatus(checks=checks, result=all(value for value in checks.values()),
+                     checked_at=router.status_checks.checked_at)
 
 
 @router.get('/')
-def get_status():
+async def get_status():
+    """
+    Obtient le statut actuel de l'API, tel que vérifié par la job en background.
+    """
+    return await get_api_status()
+
+
+@router.get('/live')
+async def get_liveness():
+    """
+    Sonde de liveness : l'API répond. Ne fait aucune vérification.
+    """
+    return {'result': True}
+
+
+@router.get('/ready')
+async def get_readiness(response: Response):
     """
-    Obtient le statut actuel de l'API.
+    Sonde de readiness : statut détaillé de l'API, avec le code 503 si une vérification échoue ou si le dernier
+    résultat est trop vieux.
     """
-    checks = {
-        'wpgarlic_root': Path('wpgarlic').is_dir(),
-        'wpgarlic_exec': Path('wpgarlic/fuzz_plugin.py').is_file(),
-        'docker': check_if_command_exists(['docker', 'version']),
-        'docker-compose': check_if_command_exists(['docker-compose', 'version'])
-    }
-    return APIStatus(checks=checks, result=all(value for value in checks.values()))
+    status = await get_api_status()
+    if not status.result or (router.status_checks.enabled and router.status_checks.stale):
+        response.status_code = 503
+    return status
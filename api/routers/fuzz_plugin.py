@@ -1,93 +1,360 @@
 """
 Router : Fuzz Plugin
 """
+import asyncio
 import json
+import logging
 import os
 import shutil
 import subprocess
-from enum import Enum, auto
+from enum import Enum
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Body, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 
-from jobs.watch_process import WatchProcess
-from routers.wordpress import check_if_plugin_exists
+from jobs.fuzz_scheduler import ACTIVE_STATES, FuzzerState, FuzzJob, FuzzScheduler, get_default_workers
+from metrics import observe_findings_timings, register_scheduler
+from routers.wordpress import check_if_plugin_exists, check_plugins
+from storage import job_store
+from storage.results_store import ResultsStore, get_default_path
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix='/fuzz_plugin', tags=['fuzz_plugin'])
 
-router.wpgarlic_process = None
-router.wpgarlic_results = {}
+router.results_store = ResultsStore(get_default_path())
+
+FINDING_FIELDS = ('id', 'data', 'intercepted_variables_info', 'file_path', 'file_or_action')
+STREAM_BATCH_SIZE = 500
+PROGRESS_INTERVAL = 1.0
+
+
+class FindingKind(str, Enum):
+    """
+    Types de trouvailles
+    """
+    OUTPUT = 'output'
+    HEADER = 'header'
+    CALL = 'call'
+
+
+class ResultsFormat(str, Enum):
+    """
+    Formats de réponse des résultats
+    """
+    JSON = 'json'
+    NDJSON = 'ndjson'
+
 
+def check_can_fuzz(plugin_name: str):
+    """
+    Vérifie qu'un plugin n'est pas déjà en cours de fuzzing, en file d'attente ou fuzzé.
+    Lance une HTTPException sinon. Bloquant (SQLite) : à appeler hors de la boucle asyncio.
+    """
+    job = router.scheduler.get_job(plugin_name)
+    if job is not None and (job.state in ACTIVE_STATES or job.state == FuzzerState.QUEUED):
+        raise HTTPException(status_code=409, detail=f'The plugin "{plugin_name}" is already {job.state.name.lower()}.')
+    if router.results_store.has_plugin(plugin_name):
+        raise HTTPException(status_code=403, detail='This plugin has already been fuzzed.')
 
-class FuzzerState(Enum):
+
+@router.post('/', status_code=202)
+async def fuzz_campaign(slugs: List[str] = Body(..., examples=[['akismet', 'hello-dolly']])):
     """
-    États possible du Fuzzer
+    Soumet une campagne de fuzzing : plusieurs plugins en une seule requête.
+    L'existence des plugins est vérifiée en une seule passe (voir POST /wordpress/check), puis les plugins valides
+    sont ajoutés à la file d'attente.
+    :param slugs: Noms (slug names) des plugins WordPress
+    :return: Le résultat de chaque plugin : la job créée, ou l'erreur (status_code et detail)
     """
-    NOT_STARTED = auto()
-    BUILDING = auto()
-    FUZZING = auto()
+    results = {}
+    candidates = []
+
+    def check_candidates():
+        for slug in dict.fromkeys(slugs):
+            try:
+                check_can_fuzz(slug)
+                candidates.append(slug)
+            except HTTPException as ex:
+                results[slug] = {'status_code': ex.status_code, 'detail': ex.detail}
+
+    await run_in_threadpool(check_candidates)
+
+    checks = (await check_plugins(candidates))['data'] if candidates else {}
+    accepted = []
+    for slug, check in checks.items():
+        if check['exists']:
+            accepted.append(slug)
+        elif check['exists'] is False:
+            results[slug] = {'status_code': 404, 'detail': 'Plugin not found on wordpress.org'}
+        else:
+            results[slug] = {'status_code': 502, 'detail': check['error']}
+
+    # L'enregistrement des jobs (SQLite) est bloquant, leur préparation est faite en background
+    jobs = await run_in_threadpool(lambda: [router.scheduler.submit(slug) for slug in accepted])
+    for job in jobs:
+        results[job.slug] = {'status_code': 202, 'job': job.to_dict()}
+    return {
+        'data': {slug: results[slug] for slug in dict.fromkeys(slugs)},
+        'submitted': len(jobs),
+        'rejected': len(results) - len(jobs)
+    }
 
 
 @router.post('/{plugin_name}', status_code=202)
-def fuzz(plugin_name: str):
+async def fuzz(plugin_name: str):
     """
     Démarre le fuzzer sur un plugin.
     :param plugin_name: Nom (slug name) du plugin WordPress
     """
-    if router.wpgarlic_process is not None:
-        raise HTTPException(status_code=409,
-                            detail=f'The fuzzer is already fuzzing "{router.wpgarlic_process.args[-1]}".')
-    if plugin_name in router.wpgarlic_results:
-        raise HTTPException(status_code=403, detail='This plugin has already been fuzzed.')
-    check_if_plugin_exists(plugin_name)  # Lance une exception si non trouvé
+    await run_in_threadpool(check_can_fuzz, plugin_name)
+    await check_if_plugin_exists(plugin_name)  # Lance une exception si non trouvé
+
+    # L'enregistrement de la job (SQLite) est bloquant, sa préparation est faite en background
+    job = await run_in_threadpool(router.scheduler.submit, plugin_name)
+    if job.state == FuzzerState.QUEUED:
+        return {'message': f'Plugin {plugin_name} queued for fuzzing', 'job': job.to_dict()}
+    return {'message': f'Fuzzer starting with plugin {plugin_name}', 'job': job.to_dict()}
+
+
+def findings_command(job: FuzzJob) -> List[str]:
+    """
+    Obtient la commande d'extraction des trouvailles (print_findings.py) d'une job.
+    """
+    return ['python', 'print_findings.py', 'data/plugin_fuzz_results/',
+            '--jobs', os.environ.get('FINDINGS_JOBS', '1'),
+            '--timings-file', 'data/findings_timings.json',
+            '--archive-bundle', f'{os.getcwd()}/wpgarlic/data/scanned_results/{job.slug}.reports.zip']
 
+
+def start_findings(job: FuzzJob):
+    """
+    Démarre l'extraction incrémentale des trouvailles d'une job, pendant son fuzz.
+    Chaque fichier de résultats est analysé dès qu'il est écrit, et data/output.json contient les résultats partiels.
+    """
     # pylint: disable=consider-using-with
     # L'utilisation de with (context manager) n'est pas viable puisque le processus roule en background
-    router.wpgarlic_process = subprocess.Popen(['python', 'fuzz_plugin.py', plugin_name], cwd='./wpgarlic/',
-                                               stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
-    WatchProcess(router.wpgarlic_process, on_finish=callback, args=plugin_name).start()
+    job.findings_process = subprocess.Popen(findings_command(job) + [
+        '--follow', '--stop-file', 'data/fuzz_done',
+        '--poll-interval', os.environ.get('FINDINGS_POLL_INTERVAL', '5')
+    ], cwd=job.workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def follower_succeeded(job: FuzzJob, returncode: Optional[int]) -> bool:
+    """
+    Vérifie si l'extraction incrémentale des trouvailles a produit le fichier final.
+    :param returncode: Code de retour de print_findings.py, None pour un processus adopté (inconnu) : le fichier
+    final est alors celui écrit après la création de data/fuzz_done
+    """
+    output_path = f'{job.workdir}/data/output.json'
+    if returncode is not None:
+        return returncode == 0 and os.path.isfile(output_path)
+    try:
+        return os.path.getmtime(output_path) >= os.path.getmtime(f'{job.workdir}/data/fuzz_done')
+    except OSError:
+        return False
+
+
+def callback(job: FuzzJob):
+    """
+    Callback lorsque WPGarlic a terminé son exécution pour une job.
+    L'environnement WordPress de la job est ensuite rendu au pool par l'ordonnanceur, sans être arrêté.
+    """
+    extracted = False
+    if job.findings_process is not None:
+        # Seuls les derniers fichiers de résultats restent à analyser
+        with open(f'{job.workdir}/data/fuzz_done', 'w', encoding='utf-8'):
+            pass
+        returncode = job.findings_process.wait()
+        job.findings_process = None
+        extracted = follower_succeeded(job, returncode)
+        if not extracted:
+            logger.warning('Incremental findings extraction of %s failed (return code %s), analyzing the whole '
+                           'folder again', job.slug, returncode)
+    if not extracted:
+        # Les rapports sans résultat déjà archivés par l'extraction incrémentale ne sont pas réanalysés
+        subprocess.run(findings_command(job),
+                       cwd=job.workdir,
+                       check=False,
+                       stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+    results_path = f'{os.getcwd()}/wpgarlic/data/scanned_results/{job.slug}.json'
+    shutil.move(f'{job.workdir}/data/output.json', results_path)
+    with open(results_path, 'r', encoding='utf-8') as results_file:
+        router.results_store.add_results(job.slug, json.load(results_file))
+    # Les métriques ne doivent jamais changer le résultat de la job
+    try:
+        with open(f'{job.workdir}/data/findings_timings.json', 'r', encoding='utf-8') as timings_file:
+            observe_findings_timings(json.load(timings_file))
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, AttributeError, TypeError) as ex:
+        logger.warning('Unable to read the print_findings timings of %s: %s', job.slug, ex)
+
 
-    return {'message': f'Fuzzer started with plugin {plugin_name}'}
+router.scheduler = FuzzScheduler(get_default_workers(), on_finish=callback, on_start=start_findings,
+                                 store=job_store.JobStore(job_store.get_default_path()))
+register_scheduler(router.scheduler)
 
 
-def callback(slug):
+async def startup():
     """
-    Callback lorsque WPGarlic a terminé son exécution.
+    Démarre l'ordonnanceur, qui reprend les jobs laissées en cours par une instance précédente de l'API.
     """
-    router.wpgarlic_process = None
-    subprocess.run(['python', 'print_findings.py', 'data/plugin_fuzz_results/'],
-                   cwd='./wpgarlic/',
-                   check=False,
-                   stdout=subprocess.DEVNULL,
-                   stderr=subprocess.DEVNULL)
-    shutil.move(os.getcwd() + '/wpgarlic/data/output.json',
-                f'{os.getcwd()}/wpgarlic/data/scanned_results/{slug}.json')
-    router.wpgarlic_results[slug] = f'{os.getcwd()}/wpgarlic/data/scanned_results/{slug}.json'
-    subprocess.run(['docker-compose', 'down'],
-                   cwd='./wpgarlic/',
-                   check=False,
-                   stdout=subprocess.DEVNULL,
-                   stderr=subprocess.DEVNULL)
+    await run_in_threadpool(router.scheduler.start)
+
+
+async def shutdown():
+    """
+    Arrête les environnements WordPress inutilisés du pool.
+    """
+    await run_in_threadpool(router.scheduler.close)
 
 
 @router.get('/state')
 def get_fuzzer_state():
     """
-    Obtient l'état actuel du Fuzzer.
+    Obtient l'état actuel du Fuzzer, ainsi que l'état de chaque job.
+    """
+    active_jobs = router.scheduler.active_jobs()
+    return {
+        'state': FuzzerState.FUZZING.name if active_jobs else FuzzerState.NOT_STARTED.name,
+        'workers': router.scheduler.max_workers,
+        'active': len(active_jobs),
+        'queued': len(router.scheduler.queued_jobs()),
+        'jobs': [job.to_dict() for job in router.scheduler.all_jobs()]
+    }
+
+
+async def stream_progress(request: Request, job: FuzzJob):
+    """
+    Génère les événements Server-Sent Events de la progression d'une job, jusqu'à la fin de son traitement.
+    """
+    while not await request.is_disconnected():
+        # Les trouvailles partielles sont lues depuis data/output.json : hors de la boucle d'événements
+        data = json.dumps(await run_in_threadpool(job.to_dict))
+        if job.state in (FuzzerState.FINISHED, FuzzerState.FAILED):
+            yield f'event: end\ndata: {data}\n\n'
+            return
+        yield f'event: progress\ndata: {data}\n\n'
+        await asyncio.sleep(PROGRESS_INTERVAL)
+
+
+@router.get('/progress/{plugin_name}',
+            summary='Stream the progress of a fuzz',
+            description='Server-Sent Events stream (`text/event-stream`): a `progress` event every second with the '
+                        'job state, elapsed time, fuzzed files/actions, findings extracted so far and last fuzzer '
+                        'output line, then an `end` event once the results are processed.')
+async def get_fuzz_progress(request: Request, plugin_name: str):
+    """
+    Diffuse la progression du fuzz d'un plugin en temps réel (Server-Sent Events).
+    :param plugin_name: Nom du plugin
+    """
+    job = router.scheduler.get_job(plugin_name)
+    if job is None:
+        raise HTTPException(status_code=404, detail='No fuzz job for this plugin.')
+    return StreamingResponse(stream_progress(request, job), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def project_finding(finding_id: int, entry: dict, fields: Optional[list]) -> dict:
     """
-    if router.wpgarlic_process is None:
-        return FuzzerState.NOT_STARTED.name
-    return FuzzerState.FUZZING.name
+    Ne conserve que les champs demandés d'une trouvaille.
+    :param finding_id: Identifiant de la trouvaille, utilisable comme curseur
+    :param entry: Trouvaille, telle que dans output.json
+    :param fields: Champs à conserver, None pour tous (sauf l'identifiant)
+    """
+    if fields is None:
+        return entry
+    entry = {**entry, 'id': finding_id}
+    return {field: entry.get(field) for field in fields}
+
+
+def stream_findings(plugin_name: str, filters: dict, fields: Optional[list], cursor: int, limit: Optional[int]):
+    """
+    Génère les trouvailles au format NDJSON, une par ligne.
+    Les trouvailles sont lues par lots, chaque lot étant une requête indépendante : le générateur peut donc être
+    itéré depuis n'importe quel thread.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        batch_size = STREAM_BATCH_SIZE if remaining is None else min(STREAM_BATCH_SIZE, remaining)
+        page = router.results_store.get_findings_page(plugin_name, after_id=cursor, limit=batch_size, **filters)
+        for finding_id, entry in page:
+            yield json.dumps(project_finding(finding_id, entry, fields)) + '\n'
+        if len(page) < batch_size:
+            return
+        cursor = page[-1][0]
+        if remaining is not None:
+            remaining -= len(page)
 
 
 @router.get('/results/{plugin_name}')
-def get_plugin_results(plugin_name: str):
+def get_plugin_results(request: Request, plugin_name: str, *,  # pylint: disable=too-many-arguments
+                       kind: Optional[FindingKind] = None,
+                       file_or_action: Optional[str] = None,
+                       fields: Optional[str] = Query(None, description=f'Comma-separated subset of {FINDING_FIELDS}'),
+                       cursor: int = Query(0, ge=0, description='Return findings after this finding id'),
+                       limit: Optional[int] = Query(None, ge=1, description='Maximum number of findings'),
+                       response_format: ResultsFormat = Query(ResultsFormat.JSON, alias='format')):
     """
     Obtient les résultats filtrés d'un plugin.
+    Les trouvailles peuvent être filtrées (type, fichier/action), paginées par curseur, réduites à certains champs,
+    et diffusées au format NDJSON (une trouvaille par ligne).
     :param plugin_name: Nom du plugin
     """
-    if plugin_name not in router.wpgarlic_results:
+    summary = router.results_store.get_summary(plugin_name)
+    if summary is None:
         raise HTTPException(status_code=404, detail="Plugin not found in fuzzed plugins history")
-    return json.load(open(router.wpgarlic_results[plugin_name], 'r', encoding='utf-8'))
+
+    projection = None
+    if fields is not None:
+        projection = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown_fields = set(projection) - set(FINDING_FIELDS)
+        if unknown_fields:
+            raise HTTPException(status_code=422, detail=f'Unknown fields: {", ".join(sorted(unknown_fields))}.')
+    filters = {'kind': kind.value if kind is not None else None, 'file_or_action': file_or_action}
+
+    if response_format == ResultsFormat.NDJSON:
+        return StreamingResponse(stream_findings(plugin_name, filters, projection, cursor, limit),
+                                 media_type='application/x-ndjson')
+
+    # Une trouvaille de plus que demandé permet de savoir s'il existe une page suivante
+    page = router.results_store.get_findings_page(plugin_name, after_id=cursor,
+                                                  limit=limit + 1 if limit is not None else None, **filters)
+    next_url = None
+    if limit is not None and len(page) > limit:
+        page = page[:limit]
+        next_url = f'{request.url.include_query_params(cursor=page[-1][0])}'
+    return {
+        **summary,
+        'data': [project_finding(finding_id, entry, projection) for finding_id, entry in page],
+        'next': next_url
+    }
+
+
+@router.get('/results/{plugin_name}/partial',
+            summary='Get the partial results of a running fuzz',
+            description='Findings extracted so far from the result files already written by the fuzzer, in the '
+                        'print_findings output format, with `"partial": true`.')
+def get_partial_results(plugin_name: str):
+    """
+    Obtient les résultats partiels d'un plugin en cours de fuzzing.
+    :param plugin_name: Nom du plugin
+    """
+    job = router.scheduler.get_job(plugin_name)
+    if job is None or job.state not in ACTIVE_STATES:
+        raise HTTPException(status_code=404, detail='This plugin is not being fuzzed.')
+    if job.workdir is None:  # Environnement pas encore attribué
+        raise HTTPException(status_code=404, detail='No result file has been analyzed yet.')
+    try:
+        # Le fichier est remplacé (et non réécrit) à chaque mise à jour : il est lu en une fois
+        with open(os.path.join(job.workdir, 'data', 'output.json'), 'rb') as output_file:
+            return Response(content=output_file.read(), media_type='application/json')
+    except FileNotFoundError as ex:
+        raise HTTPException(status_code=404, detail='No result file has been analyzed yet.') from ex
 
 
 @router.get('/history')
@@ -96,5 +363,5 @@ def get_scanned_plugins():
     Obtient la liste des plugins déjà traités par le Fuzzer.
     """
     return {
-        'data': list(router.wpgarlic_results.keys())
+        'data': router.results_store.get_plugins()
     }
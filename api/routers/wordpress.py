@@ -1,31 +1,78 @@
 """
 Router : WordPress
 """
+import asyncio
+import os
 from math import ceil
 from random import randint
+from typing import List, Optional
 
-import requests
-from fastapi import APIRouter, HTTPException, Request
+import httpx
+from fastapi import APIRouter, Body, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 
-BASE_URL = "https://api.wordpress.org/plugins/info/1.2/"
+from clients.response_cache import ResponseCache
+from clients.wordpress_org import BASE_URL, PER_PAGE, create_client, query_plugins
+from jobs.catalog_sync import CatalogSync
+from storage.plugin_catalog import BROWSE_ORDERS, PluginCatalog, get_default_path
 
 router = APIRouter(prefix="/wordpress", tags=['wordpress'])
 
+# Durée de vie (secondes) des réponses de wordpress.org en cache, par action
+CACHE_TTLS = {
+    'query_plugins': 600,
+    'plugin_information': 3600
+}
+
+# Nombre maximal de slugs par vérification groupée
+MAX_CHECK_SLUGS = 1000
+
+router.client = None
+router.cache = None
+router.catalog = PluginCatalog(get_default_path())
+router.catalog_sync = CatalogSync(router.catalog)
+
+
+async def startup():
+    """
+    Crée le client HTTP partagé vers wordpress.org, et démarre la synchronisation du catalogue.
+    """
+    router.client = create_client()
+    router.cache = ResponseCache(router.client, ttls=CACHE_TTLS)
+    if router.catalog_sync.enabled:
+        router.catalog_sync.start(router.client)
+
+
+async def shutdown():
+    """
+    Arrête la synchronisation du catalogue, et ferme les connexions vers wordpress.org.
+    """
+    await router.catalog_sync.stop()
+    await router.client.aclose()
+
 
 @router.get('/plugins')
-def get_plugins(request: Request, browse: str = 'popular', page: int = 1):
+async def get_plugins(request: Request, browse: str = 'popular', page: int = 1):
     """
     Obtient la liste des plugins WordPress.
-    Agit comme proxy vers le site officiel wordpress.org.
-    ATTENTION, cette requête n'est présentement pas optimisée, 1.8 minutes pour obtenir la liste complète.
+    Servie par le catalogue local lorsqu'il est synchronisé, sinon agit comme proxy vers le site officiel wordpress.org.
     """
-    params = {
-        "action": "query_plugins",
-        "request[per_page]": 250,  # number of plugins per page
-        "request[page]": page,
-        "request[browse]": browse
-    }
-    response = requests.get(BASE_URL, params=params, timeout=30)
+    # Les lectures du catalogue (SQLite) sont bloquantes, elles sont faites hors de la boucle asyncio
+    if browse in BROWSE_ORDERS and await run_in_threadpool(router.catalog.is_ready):
+        total = await run_in_threadpool(router.catalog.count)
+        pages = max(1, ceil(total / PER_PAGE))
+        if page < 1 or page > pages:
+            raise HTTPException(status_code=403, detail=f'Page number must be between 1 and {pages}.')
+        plugins = await run_in_threadpool(router.catalog.get_page, browse, page, PER_PAGE)
+        return {
+            'data': plugins,
+            'count': len(plugins),
+            'total': total,
+            'pages': pages,
+            'next': f'{request.url.replace_query_params(browse=browse, page=page + 1)}' if page < pages else None
+        }
+
+    response = await query_plugins(router.cache, page, browse)
     if response.status_code != 200:
         raise HTTPException(status_code=502,
                             detail={
@@ -49,12 +96,16 @@ def get_plugins(request: Request, browse: str = 'popular', page: int = 1):
 
 
 @router.get('/plugins_count')
-def get_plugins_count():
+async def get_plugins_count():
     """
     Obtient le nombre total de plugins.
     """
+    if await run_in_threadpool(router.catalog.is_ready):
+        return {
+            'count': await run_in_threadpool(router.catalog.count)
+        }
     params = {"action": "query_plugins"}
-    response = requests.get(BASE_URL, params=params, timeout=30)
+    response = await router.cache.get(BASE_URL, params=params)
     if response.status_code != 200:
         raise HTTPException(status_code=502,
                             detail={
@@ -71,37 +122,62 @@ def get_plugins_count():
 
 @router.get('/random_plugin',
             summary='Get a random plugin',
-            description='Get a random plugin on wordpress.org. `random.randint` is used to generate a random index.')
-def get_random_plugin():
+            description='Get a random plugin on wordpress.org, sampled uniformly from the local catalog once it is '
+                        'synchronized. Otherwise, `random.randint` is used to generate a random index.')
+async def get_random_plugin():
     """
     Obtient un plugin aléatoire parmis les ~5K plugins de WordPress.org.
+    Servi par le catalogue local lorsqu'il est synchronisé, sans appel à wordpress.org.
     """
-    total = get_plugins_count()['count']
+    if await run_in_threadpool(router.catalog.is_ready):
+        plugins = await run_in_threadpool(router.catalog.get_plugins, router.catalog.sampler.sample())
+        if not plugins:
+            raise HTTPException(status_code=404, detail='The local plugin catalog is empty.')
+        return plugins[0]
+    total = (await get_plugins_count())['count']
     i = randint(1, total)
-    page = ceil(i / 250.0)
+    page = ceil(i / float(PER_PAGE))
     params = {
         "action": "query_plugins",
-        "request[per_page]": 250,  # number of plugins per page
+        "request[per_page]": PER_PAGE,  # number of plugins per page
         "request[page]": page
     }
-    response = requests.get(BASE_URL, params=params, timeout=30)
+    response = await router.cache.get(BASE_URL, params=params)
     data = response.json()
-    plugin = data['plugins'][i - 250 * (page - 1) - 1]
+    plugin = data['plugins'][i - PER_PAGE * (page - 1) - 1]
     return plugin
 
 
-@router.get('/check/{plugin_name}')
-def check_if_plugin_exists(plugin_name: str):
+@router.get('/random_plugins',
+            summary='Get random plugins',
+            description='Get N distinct random plugins from the local catalog, uniformly or stratified by active '
+                        'installs (equal share per order of magnitude of active installs).')
+async def get_random_plugins(count: int = Query(1, ge=1, le=1000), stratified: bool = False):
     """
-    Vérifie si un plugin existe sur wordpress.org.
-    :param plugin_name: Nom du plugin à vérifier
-    :return: 404 si le plugin n'existe pas, 200 si trouvé, avec l'objet JSON
+    Obtient des plugins aléatoires distincts du catalogue local, par exemple pour une campagne de fuzzing.
+    :param count: Nombre de plugins
+    :param stratified: Répartir les plugins également entre les ordres de grandeur d'installations actives
+    """
+    if not await run_in_threadpool(router.catalog.is_ready):
+        raise HTTPException(status_code=503, detail='The local plugin catalog is not synchronized yet.')
+    plugins = await run_in_threadpool(router.catalog.get_plugins, router.catalog.sampler.sample(count, stratified))
+    return {
+        'data': plugins,
+        'count': len(plugins)
+    }
+
+
+async def fetch_plugin_information(plugin_name: str) -> Optional[dict]:
+    """
+    Obtient les informations d'un plugin sur wordpress.org (via le cache des réponses).
+    :param plugin_name: Nom du plugin
+    :return: None si le plugin n'existe pas
     """
     params = {
         "action": "plugin_information",
         "request[slug]": plugin_name
     }
-    response = requests.get(BASE_URL, params=params, timeout=30)
+    response = await router.cache.get(BASE_URL, params=params)
     if response.status_code not in [200, 404]:
         raise HTTPException(status_code=502,
                             detail={
@@ -111,5 +187,72 @@ def check_if_plugin_exists(plugin_name: str):
                             })
     data = response.json()
     if data.get('error', '') == 'Plugin not found.':
-        raise HTTPException(status_code=404, detail='Plugin not found on wordpress.org')
+        return None
     return data
+
+
+@router.get('/check/{plugin_name}')
+async def check_if_plugin_exists(plugin_name: str):
+    """
+    Vérifie si un plugin existe sur wordpress.org.
+    :param plugin_name: Nom du plugin à vérifier
+    :return: 404 si le plugin n'existe pas, 200 si trouvé, avec l'objet JSON
+    """
+    plugin = await run_in_threadpool(router.catalog.get_plugin, plugin_name)
+    if plugin is None:
+        # Le plugin peut être plus récent que la dernière synchronisation du catalogue
+        plugin = await fetch_plugin_information(plugin_name)
+    if plugin is None:
+        raise HTTPException(status_code=404, detail='Plugin not found on wordpress.org')
+    return plugin
+
+
+@router.post('/check',
+             summary='Check if plugins exist',
+             description=f'Check up to {MAX_CHECK_SLUGS} slugs at once. Slugs missing from the local catalog are '
+                         'checked on wordpress.org concurrently (`WORDPRESS_CHECK_CONCURRENCY`, 16 by default).')
+async def check_plugins(slugs: List[str] = Body(..., examples=[['akismet', 'hello-dolly']])):
+    """
+    Vérifie l'existence de plusieurs plugins en une seule requête, par exemple avant une campagne de fuzzing.
+    Les plugins absents du catalogue local sont vérifiés sur wordpress.org en parallèle (parallélisme borné).
+    :param slugs: Noms des plugins à vérifier
+    :return: Le résultat de chaque plugin : "exists" (None si wordpress.org n'a pas pu répondre), "name" et "version"
+    """
+    slugs = list(dict.fromkeys(slugs))
+    if len(slugs) > MAX_CHECK_SLUGS:
+        raise HTTPException(status_code=422, detail=f'At most {MAX_CHECK_SLUGS} slugs can be checked at once.')
+
+    results = {}
+    for plugin in await run_in_threadpool(router.catalog.get_plugins, slugs):
+        results[plugin['slug']] = {'exists': True, 'name': plugin.get('name'), 'version': plugin.get('version')}
+
+    semaphore = asyncio.Semaphore(int(os.environ.get('WORDPRESS_CHECK_CONCURRENCY', 16)))
+
+    async def check(slug: str):
+        async with semaphore:
+            try:
+                plugin = await fetch_plugin_information(slug)
+            except (HTTPException, httpx.HTTPError) as ex:
+                results[slug] = {'exists': None, 'error': getattr(ex, 'detail', None) or str(ex)}
+                return
+        if plugin is None:
+            results[slug] = {'exists': False}
+        else:
+            results[slug] = {'exists': True, 'name': plugin.get('name'), 'version': plugin.get('version')}
+
+    await asyncio.gather(*(check(slug) for slug in slugs if slug not in results))
+
+    return {
+        'data': {slug: results[slug] for slug in slugs},
+        'found': sum(1 for result in results.values() if result['exists']),
+        'not_found': sum(1 for result in results.values() if result['exists'] is False),
+        'errors': sum(1 for result in results.values() if result['exists'] is None)
+    }
+
+
+@router.get('/cache')
+async def get_cache_stats():
+    """
+    Obtient les compteurs du cache des réponses de wordpress.org (hits, misses, revalidations, coalesced...).
+    """
+    return router.cache.stats()
@@ -0,0 +1,81 @@
+"""
+Stockage : Jobs du Fuzzer
+"""
+
+import os
+import time
+from typing import List
+
+from storage.sqlite_store import SQLiteStore
+
+JOB_COLUMNS = ('slug', 'state', 'pid', 'findings_pid', 'environment', 'workdir', 'submitted_at', 'started_at',
+               'returncode', 'wall_time', 'cpu_seconds', 'max_rss', 'read_bytes', 'write_bytes')
+
+
+def get_default_path() -> str:
+    """
+    Obtient le chemin de la base de données, configurable via la variable d'environnement JOBS_DB.
+    """
+    return os.environ.get('JOBS_DB', 'wpgarlic/data/jobs.sqlite3')
+
+
+class JobStore(SQLiteStore):
+    """
+    File d'attente persistante (SQLite, mode WAL) des jobs du Fuzzer.
+    L'état, les PIDs et le dossier de travail de chaque job sont enregistrés à chaque transition, afin que l'API
+    puisse reprendre les jobs en cours après un redémarrage.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        slug TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        pid INTEGER,
+        findings_pid INTEGER,
+        environment TEXT,
+        workdir TEXT,
+        submitted_at REAL NOT NULL,
+        started_at REAL,
+        returncode INTEGER,
+        wall_time REAL,
+        cpu_seconds REAL,
+        max_rss INTEGER,
+        read_bytes INTEGER,
+        write_bytes INTEGER,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, submitted_at);
+    """
+
+    # Ressources consommées par chaque job, absentes des bases créées avant leur mesure
+    ADDED_COLUMNS = {
+        'jobs': ('cpu_seconds REAL', 'max_rss INTEGER', 'read_bytes INTEGER', 'write_bytes INTEGER')
+    }
+
+    def save(self, job: dict):
+        """
+        Enregistre une job, en remplaçant son état précédent.
+        :param job: Valeurs des colonnes JOB_COLUMNS
+        """
+        with self._connection() as connection:
+            connection.execute(
+                f'INSERT OR REPLACE INTO jobs ({", ".join(JOB_COLUMNS)}, updated_at)'
+                f' VALUES ({", ".join("?" * len(JOB_COLUMNS))}, ?)',
+                [job.get(column) for column in JOB_COLUMNS] + [time.time()])
+
+    def get_jobs(self) -> List[dict]:
+        """
+        Obtient toutes les jobs, dans l'ordre de soumission.
+        """
+        rows = self._connection().execute(f'SELECT {", ".join(JOB_COLUMNS)} FROM jobs ORDER BY submitted_at')
+        return [dict(zip(JOB_COLUMNS, row)) for row in rows]
+
+    def delete_finished(self, before: float) -> int:
+        """
+        Supprime les jobs terminées (FINISHED ou FAILED) soumises avant une date.
+        :param before: Timestamp
+        :return: Nombre de jobs supprimées
+        """
+        with self._connection() as connection:
+            return connection.execute("DELETE FROM jobs WHERE state IN ('FINISHED', 'FAILED') AND submitted_at < ?",
+                                      (before,)).rowcount
@@ -0,0 +1,198 @@
+"""
+Stockage : Catalogue local des plugins de wordpress.org
+"""
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+from storage.plugin_sampler import PluginSampler
+from storage.sqlite_store import SQLiteStore
+
+# Ordre local équivalent à chaque valeur "browse" de l'API de wordpress.org
+BROWSE_ORDERS = {
+    'popular': 'popular_rank IS NULL, popular_rank, active_installs DESC',
+    'new': 'added DESC',
+    'updated': 'last_updated DESC',
+}
+
+
+def get_default_path() -> str:
+    """
+    Obtient le chemin de la base de données, configurable via la variable d'environnement CATALOG_DB.
+    """
+    return os.environ.get('CATALOG_DB', 'wpgarlic/data/catalog.sqlite3')
+
+
+def parse_last_updated(value: Optional[str]) -> Optional[float]:
+    """
+    Convertit la date de dernière mise à jour de wordpress.org (ex. "2023-03-01 5:12pm GMT") en timestamp.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.strptime(value, '%Y-%m-%d %I:%M%p GMT')
+    except ValueError:
+        return None
+    return parsed.replace(tzinfo=timezone.utc).timestamp()
+
+
+class PluginCatalog(SQLiteStore):
+    """
+    Miroir local du catalogue des plugins de wordpress.org : slugs, métadonnées et versions.
+    Rempli par la job CatalogSync, il permet de servir le router wordpress sans appel à wordpress.org.
+    Les slugs sont aussi conservés en mémoire (sampler), pour l'échantillonnage aléatoire.
+    Chaque synchronisation complète a un numéro (génération), enregistré sur les plugins qu'elle obtient : une fois
+    terminée, les plugins qu'elle n'a pas vus ont été retirés de wordpress.org, et sont supprimés.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS plugins (
+        slug TEXT PRIMARY KEY,
+        name TEXT,
+        version TEXT,
+        active_installs INTEGER NOT NULL DEFAULT 0,
+        added TEXT,
+        last_updated REAL,
+        popular_rank INTEGER,
+        data TEXT NOT NULL,
+        sync_generation INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS plugins_popular ON plugins (popular_rank);
+    CREATE INDEX IF NOT EXISTS plugins_added ON plugins (added);
+    CREATE INDEX IF NOT EXISTS plugins_last_updated ON plugins (last_updated);
+    CREATE TABLE IF NOT EXISTS sync_state (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """
+
+    # Bases créées avant le suivi des générations
+    ADDED_COLUMNS = {
+        'plugins': ('sync_generation INTEGER NOT NULL DEFAULT 0',)
+    }
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.sampler = self._load_sampler()
+
+    def _load_sampler(self) -> PluginSampler:
+        """
+        Remplit un sampler avec tous les plugins du catalogue.
+        """
+        sampler = PluginSampler()
+        for slug, active_installs in self._connection().execute('SELECT slug, active_installs FROM plugins'):
+            sampler.add(slug, active_installs)
+        return sampler
+
+    def upsert_plugins(self, plugins: Iterable[dict], first_rank: Optional[int] = None,
+                       generation: Optional[int] = None):
+        """
+        Ajoute ou met à jour des plugins, tels que retournés par l'action query_plugins.
+        :param plugins: Plugins à enregistrer
+        :param first_rank: Rang de popularité du premier plugin, si la liste provient de browse=popular
+        :param generation: Génération de la synchronisation complète ayant obtenu les plugins, le cas échéant
+        """
+        rows = []
+        for i, plugin in enumerate(plugins):
+            rows.append((plugin['slug'], plugin.get('name'), plugin.get('version'),
+                         int(plugin.get('active_installs') or 0), plugin.get('added'),
+                         parse_last_updated(plugin.get('last_updated')),
+                         first_rank + i if first_rank is not None else None, json.dumps(plugin), generation))
+        with self._connection() as connection:
+            # Le rang de popularité et la génération ne sont remplacés que s'ils sont connus
+            connection.executemany(
+                'INSERT INTO plugins (slug, name, version, active_installs, added, last_updated, popular_rank, data,'
+                ' sync_generation) VALUES (?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, 0))'
+                ' ON CONFLICT (slug) DO UPDATE SET name = excluded.name, version = excluded.version,'
+                ' active_installs = excluded.active_installs, added = excluded.added,'
+                ' last_updated = excluded.last_updated, data = excluded.data,'
+                ' popular_rank = COALESCE(excluded.popular_rank, popular_rank),'
+                ' sync_generation = MAX(excluded.sync_generation, sync_generation)', rows)
+        for row in rows:
+            self.sampler.add(row[0], row[3])
+
+    def get_state(self, key: str) -> Optional[str]:
+        """
+        Obtient une valeur de l'état de synchronisation.
+        """
+        row = self._connection().execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_state(self, key: str, value: str):
+        """
+        Enregistre une valeur de l'état de synchronisation.
+        """
+        with self._connection() as connection:
+            connection.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, value))
+
+    def is_ready(self) -> bool:
+        """
+        Vérifie si le catalogue a été complètement synchronisé au moins une fois.
+        """
+        return self.get_state('last_full_sync') is not None
+
+    def next_generation(self) -> int:
+        """
+        Obtient la génération d'une nouvelle synchronisation complète.
+        """
+        return int(self.get_state('sync_generation') or 0) + 1
+
+    def mark_full_sync(self, generation: int) -> int:
+        """
+        Indique que le catalogue vient d'être complètement synchronisé, et supprime les plugins que cette
+        synchronisation n'a pas obtenus.
+        :param generation: Génération de la synchronisation complète
+        :return: Nombre de plugins supprimés
+        """
+        with self._connection() as connection:
+            removed = connection.execute('DELETE FROM plugins WHERE sync_generation < ?', (generation,)).rowcount
+            connection.executemany('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)',
+                                   [('sync_generation', str(generation)), ('last_full_sync', str(time.time()))])
+        if removed:
+            self.sampler = self._load_sampler()
+        return removed
+
+    def count(self) -> int:
+        """
+        Obtient le nombre de plugins du catalogue.
+        """
+        return self._connection().execute('SELECT COUNT(*) FROM plugins').fetchone()[0]
+
+    def get_page(self, browse: str, page: int, per_page: int) -> List[dict]:
+        """
+        Obtient une page de plugins, dans l'ordre de la valeur "browse" de wordpress.org.
+        :param browse: Clé de BROWSE_ORDERS
+        :param page: Numéro de page, à partir de 1
+        :param per_page: Nombre de plugins par page
+        """
+        query = f'SELECT data FROM plugins ORDER BY {BROWSE_ORDERS[browse]} LIMIT ? OFFSET ?'
+        rows = self._connection().execute(query, (per_page, (page - 1) * per_page))
+        return [json.loads(row[0]) for row in rows]
+
+    def get_plugin(self, slug: str) -> Optional[dict]:
+        """
+        Obtient un plugin du catalogue.
+        :return: None si le plugin n'est pas dans le catalogue
+        """
+        row = self._connection().execute('SELECT data FROM plugins WHERE slug = ?', (slug,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def get_plugins(self, slugs: List[str]) -> List[dict]:
+        """
+        Obtient des plugins du catalogue, dans l'ordre des slugs donnés (les slugs inconnus sont ignorés).
+        """
+        plugins = {}
+        for i in range(0, len(slugs), 500):  # Limite du nombre de paramètres SQLite
+            chunk = slugs[i:i + 500]
+            query = f'SELECT slug, data FROM plugins WHERE slug IN ({", ".join("?" * len(chunk))})'
+            plugins.update((row[0], json.loads(row[1])) for row in self._connection().execute(query, chunk))
+        return [plugins[slug] for slug in slugs if slug in plugins]
+
+    def get_last_updated(self) -> Optional[float]:
+        """
+        Obtient la date de mise à jour la plus récente du catalogue (timestamp).
+        """
+        return self._connection().execute('SELECT MAX(last_updated) FROM plugins').fetchone()[0]
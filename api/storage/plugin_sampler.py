@@ -0,0 +1,94 @@
+"""
+Stockage : Échantillonnage aléatoire des plugins du catalogue
+"""
+
+import random
+from threading import Lock
+from typing import Dict, List
+
+
+def get_stratum(active_installs: int) -> int:
+    """
+    Obtient la strate d'un plugin : l'ordre de grandeur de son nombre d'installations actives
+    (0 pour 0 à 9, 1 pour 10 à 99, 2 pour 100 à 999...).
+    """
+    return len(str(max(0, int(active_installs)))) - 1
+
+
+class PluginSampler:
+    """
+    Tableaux en mémoire des slugs du catalogue, afin d'obtenir des plugins aléatoires sans parcourir le catalogue :
+    un tableau de tous les slugs pour un échantillonnage uniforme, et un tableau par strate d'installations actives
+    pour un échantillonnage stratifié. Les ajouts et changements de strate sont en O(1).
+    """
+
+    def __init__(self):
+        self._slugs: List[str] = []
+        self._strata: Dict[int, List[str]] = {}
+        self._positions: Dict[str, tuple] = {}  # slug -> (strate, position dans la strate)
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._slugs)
+
+    def add(self, slug: str, active_installs: int):
+        """
+        Ajoute un plugin, ou met à jour sa strate s'il est déjà connu.
+        """
+        stratum = get_stratum(active_installs)
+        with self._lock:
+            position = self._positions.get(slug)
+            if position is None:
+                self._slugs.append(slug)
+            elif position[0] == stratum:
+                return
+            else:
+                self._remove_from_stratum(*position)
+            stratum_slugs = self._strata.setdefault(stratum, [])
+            self._positions[slug] = (stratum, len(stratum_slugs))
+            stratum_slugs.append(slug)
+
+    def _remove_from_stratum(self, stratum: int, index: int):
+        """
+        Retire un slug de sa strate en le remplaçant par le dernier (swap-remove, O(1)).
+        """
+        stratum_slugs = self._strata[stratum]
+        last = stratum_slugs.pop()
+        if index < len(stratum_slugs):
+            stratum_slugs[index] = last
+            self._positions[last] = (stratum, index)
+        if not stratum_slugs:
+            del self._strata[stratum]
+
+    def sample(self, count: int = 1, stratified: bool = False) -> List[str]:
+        """
+        Obtient des slugs aléatoires, sans remise.
+        :param count: Nombre de slugs, borné par la taille du catalogue
+        :param stratified: Si vrai, les slugs sont répartis également entre les strates d'installations actives
+        (les strates trop petites cèdent leur part aux autres), plutôt que proportionnellement à leur taille
+        """
+        with self._lock:
+            count = min(count, len(self._slugs))
+            if not stratified:
+                return random.sample(self._slugs, count)
+
+            strata = sorted(self._strata.values(), key=len)
+            samples = []
+            remaining = count
+            for i, stratum_slugs in enumerate(strata):
+                left = len(strata) - i
+                if len(stratum_slugs) * left <= remaining:
+                    # Strate trop petite pour sa part égale : elle est prise en entier, les suivantes se partagent
+                    # le reste
+                    samples.extend(stratum_slugs)
+                    remaining -= len(stratum_slugs)
+                    continue
+                # Les strates restantes sont assez grandes pour leur part égale, plus un : le reste de la division
+                # est donné à des strates choisies au hasard, plutôt que toujours aux mêmes
+                share, extra = divmod(remaining, left)
+                lucky = set(random.sample(range(i, len(strata)), extra))
+                for j in range(i, len(strata)):
+                    samples.extend(random.sample(strata[j], share + (j in lucky)))
+                break
+            random.shuffle(samples)
+            return samples
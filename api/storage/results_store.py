@@ -0,0 +1,132 @@
+"""
+Stockage : Résultats du Fuzzer
+"""
+
+import json
+import os
+import time
+from typing import List, Optional, Tuple
+
+from storage.sqlite_store import SQLiteStore
+
+HEADER_PREFIX = 'Header: '
+FILTER_COLUMNS = ('kind', 'file_or_action', 'header', 'call')
+
+
+def get_default_path() -> str:
+    """
+    Obtient le chemin de la base de données, configurable via la variable d'environnement RESULTS_DB.
+    """
+    return os.environ.get('RESULTS_DB', 'wpgarlic/data/results.sqlite3')
+
+
+def classify_finding(data) -> dict:
+    """
+    Obtient le type d'une trouvaille (output, header ou call) et les valeurs indexées.
+    :param data: Valeur "data" d'une entrée de output.json
+    """
+    if isinstance(data, dict):
+        return {'kind': 'call', 'header': None, 'call': data.get('call')}
+    if data.startswith(HEADER_PREFIX):
+        return {'kind': 'header', 'header': data[len(HEADER_PREFIX):], 'call': None}
+    return {'kind': 'output', 'header': None, 'call': None}
+
+
+class ResultsStore(SQLiteStore):
+    """
+    Stockage persistant (SQLite, mode WAL) des résultats du Fuzzer.
+    Les trouvailles sont indexées par plugin, type, header, call et fichier/action, afin de servir l'historique
+    et les recherches sans relire les fichiers output.json.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS plugins (
+        slug TEXT PRIMARY KEY,
+        summary TEXT NOT NULL,
+        fuzzed_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS findings (
+        id INTEGER PRIMARY KEY,
+        plugin TEXT NOT NULL REFERENCES plugins(slug) ON DELETE CASCADE,
+        kind TEXT NOT NULL,
+        file_path TEXT,
+        file_or_action TEXT,
+        header TEXT,
+        call TEXT,
+        entry TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS findings_plugin_kind ON findings (plugin, kind, id);
+    CREATE INDEX IF NOT EXISTS findings_plugin_file_or_action ON findings (plugin, file_or_action, id);
+    CREATE INDEX IF NOT EXISTS findings_plugin_header ON findings (plugin, header) WHERE header IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS findings_plugin_call ON findings (plugin, call) WHERE call IS NOT NULL;
+    """
+
+    def add_results(self, slug: str, output: dict):
+        """
+        Enregistre les résultats d'un plugin, en remplaçant ses résultats précédents.
+        :param slug: Nom du plugin
+        :param output: Contenu de output.json, produit par print_findings.py
+        """
+        summary = {key: value for key, value in output.items() if key != 'data'}
+        rows = []
+        for entry in output.get('data', []):
+            finding = classify_finding(entry['data'])
+            rows.append((slug, finding['kind'], entry.get('file_path'), entry.get('file_or_action'),
+                         finding['header'], finding['call'], json.dumps(entry)))
+
+        with self._connection() as connection:
+            connection.execute('DELETE FROM plugins WHERE slug = ?', (slug,))
+            connection.execute('INSERT INTO plugins (slug, summary, fuzzed_at) VALUES (?, ?, ?)',
+                               (slug, json.dumps(summary), time.time()))
+            connection.executemany('INSERT INTO findings (plugin, kind, file_path, file_or_action, header, call, entry)'
+                                   ' VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def has_plugin(self, slug: str) -> bool:
+        """
+        Vérifie si un plugin a déjà des résultats.
+        """
+        return self._connection().execute('SELECT 1 FROM plugins WHERE slug = ?', (slug,)).fetchone() is not None
+
+    def get_plugins(self) -> List[str]:
+        """
+        Obtient la liste des plugins ayant des résultats, dans l'ordre où ils ont été fuzzés.
+        """
+        return [row[0] for row in self._connection().execute('SELECT slug FROM plugins ORDER BY fuzzed_at')]
+
+    def get_summary(self, slug: str) -> Optional[dict]:
+        """
+        Obtient le sommaire (toutes les clés de output.json sauf "data") des résultats d'un plugin.
+        :return: None si le plugin n'a pas de résultats
+        """
+        row = self._connection().execute('SELECT summary FROM plugins WHERE slug = ?', (slug,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def get_findings_page(self, slug: str, after_id: int = 0, limit: Optional[int] = None,
+                          **filters) -> List[Tuple[int, dict]]:
+        """
+        Obtient une page de trouvailles d'un plugin, dans leur ordre d'origine, avec leur identifiant.
+        La pagination se fait par curseur (identifiant de la dernière trouvaille obtenue), via l'index.
+        :param slug: Nom du plugin
+        :param after_id: Curseur, seules les trouvailles suivantes sont retournées
+        :param limit: Nombre maximal de trouvailles, None pour toutes
+        :param filters: Filtres optionnels : kind (output, header ou call), file_or_action, header, call
+        """
+        conditions = ['plugin = ?', 'id > ?']
+        params = [slug, after_id]
+        for column in FILTER_COLUMNS:
+            if filters.get(column) is not None:
+                conditions.append(f'{column} = ?')
+                params.append(filters[column])
+        query = f'SELECT id, entry FROM findings WHERE {" AND ".join(conditions)} ORDER BY id'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        return [(row[0], json.loads(row[1])) for row in self._connection().execute(query, params)]
+
+    def get_findings(self, slug: str, **filters) -> List[dict]:
+        """
+        Obtient toutes les trouvailles d'un plugin, dans leur ordre d'origine, avec filtres optionnels.
+        :param slug: Nom du plugin
+        :param filters: Voir get_findings_page
+        """
+        return [entry for _, entry in self.get_findings_page(slug, **filters)]
@@ -0,0 +1,65 @@
+"""
+Stockage : Base SQLite
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Dict, Tuple
+
+
+class SQLiteStore:  # pylint: disable=too-few-public-methods
+    """
+    Base des stockages SQLite de l'API.
+    Chaque thread obtient sa propre connexion, en mode WAL : les lectures ne bloquent pas les écritures.
+    """
+
+    SCHEMA = ''
+
+    # Colonnes ajoutées au SCHEMA après sa création, par table (ex. {'jobs': ('max_rss INTEGER',)}) :
+    # CREATE TABLE IF NOT EXISTS ne modifie pas une table existante, elles y sont ajoutées au besoin
+    ADDED_COLUMNS: Dict[str, Tuple[str, ...]] = {}
+
+    def __init__(self, path: str):
+        """
+        Initialiser le stockage.
+        :param path: Chemin du fichier SQLite, créé au besoin
+        """
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as connection:
+            connection.executescript(self.SCHEMA)
+            self._add_missing_columns(connection)
+
+    def _add_missing_columns(self, connection: sqlite3.Connection):
+        """
+        Ajoute les colonnes ADDED_COLUMNS absentes d'une base créée par une version précédente.
+        """
+        for table, columns in self.ADDED_COLUMNS.items():
+            existing = {row[1] for row in connection.execute(f'PRAGMA table_info({table})')}
+            for column in columns:
+                if column.split()[0] not in existing:
+                    connection.execute(f'ALTER TABLE {table} ADD COLUMN {column}')
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Obtient la connexion du thread courant (une connexion SQLite ne doit pas être partagée entre threads).
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA foreign_keys=ON')
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        """
+        Ferme la connexion du thread courant.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
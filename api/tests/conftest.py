@@ -0,0 +1,16 @@
+"""
+Configuration des tests : les modules de l'API et les remplacements de wpgarlic (replacements/) sont importés
+depuis le dossier api/, comme dans l'image Docker. Les modules de wpgarlic (crash_detector, filtering,
+fuzzer_output_regexes) sont importés depuis WPGARLIC_DIR (api/wpgarlic par défaut), les tests qui en dépendent
+sont ignorés s'ils sont absents.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+API_ROOT = Path(__file__).resolve().parent.parent
+
+for path in (Path(os.environ.get('WPGARLIC_DIR', API_ROOT / 'wpgarlic')), API_ROOT, API_ROOT / 'replacements'):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
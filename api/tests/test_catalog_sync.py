@@ -0,0 +1,178 @@
+"""
+Tests : synchronisation du catalogue local avec un serveur wordpress.org local (stub)
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import pytest
+
+from clients import wordpress_org
+from jobs.catalog_sync import CatalogSync
+from storage.plugin_catalog import PluginCatalog
+
+
+def make_plugin(i: int, last_updated: str = '2023-01-01 5:12pm GMT') -> dict:
+    """
+    Crée un plugin tel que retourné par l'action query_plugins.
+    """
+    return {'slug': f'plugin-{i}', 'name': f'Plugin {i}', 'version': '1.0', 'active_installs': 10 * i,
+            'added': '2020-01-01', 'last_updated': last_updated}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Répond à l'action query_plugins avec les plugins du serveur, par pages de per_page plugins.
+    """
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Obtient une page de plugins.
+        """
+        query = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        self.server.requests.append(query)
+        plugins = self.server.plugins
+        if query.get('request[browse]') == 'updated':
+            plugins = sorted(plugins, key=lambda plugin: plugin['last_updated'], reverse=True)
+        per_page = int(query['request[per_page]'])
+        page = int(query['request[page]'])
+        if page in self.server.failing_pages:
+            self.send_response(500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps({
+            'info': {'page': page, 'pages': max(1, -(-len(plugins) // per_page)), 'results': len(plugins)},
+            'plugins': plugins[(page - 1) * per_page:page * per_page]
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture(name='stub')
+def fixture_stub(monkeypatch):
+    """
+    Serveur wordpress.org local, avec 25 plugins par page.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.plugins = [make_plugin(i) for i in range(60)]
+    server.failing_pages = set()
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    monkeypatch.setattr(wordpress_org, 'BASE_URL', f'http://127.0.0.1:{server.server_port}/')
+    monkeypatch.setattr('jobs.catalog_sync.PER_PAGE', 25)
+    monkeypatch.setattr(wordpress_org, 'PER_PAGE', 25)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(name='catalog')
+def fixture_catalog(tmp_path):
+    """
+    Catalogue local vide.
+    """
+    return PluginCatalog(str(tmp_path / 'catalog.sqlite3'))
+
+
+def run(coroutine_function, *args):
+    """
+    Exécute une synchronisation avec un client HTTP local.
+    """
+    async def main():
+        async with httpx.AsyncClient() as client:
+            return await coroutine_function(client, *args)
+    return asyncio.run(main())
+
+
+def test_full_sync(stub, catalog):
+    """
+    La synchronisation complète obtient toutes les pages, et conserve le rang de popularité.
+    """
+    run(CatalogSync(catalog).full_sync)
+    assert catalog.is_ready()
+    assert catalog.count() == 60
+    assert len(catalog.sampler) == 60
+    assert [plugin['slug'] for plugin in catalog.get_page('popular', 3, 25)] == \
+        [f'plugin-{i}' for i in range(50, 60)]
+    assert len(stub.requests) == 3
+
+
+def test_full_sync_removes_missing_plugins(stub, catalog):
+    """
+    Les plugins retirés de wordpress.org sont supprimés à la synchronisation complète suivante.
+    """
+    run(CatalogSync(catalog).full_sync)
+    del stub.plugins[10:20]
+    run(CatalogSync(catalog).full_sync)
+    assert catalog.count() == 50
+    assert catalog.get_plugin('plugin-15') is None
+    assert 'plugin-15' not in catalog.sampler.sample(50)
+
+
+def test_failed_full_sync_keeps_plugins(stub, catalog):
+    """
+    Une synchronisation complète interrompue ne supprime aucun plugin.
+    """
+    run(CatalogSync(catalog).full_sync)
+    del stub.plugins[10:20]
+    stub.failing_pages.add(2)
+    with pytest.raises(httpx.HTTPStatusError):
+        run(CatalogSync(catalog).full_sync)
+    assert catalog.count() == 60
+
+
+def test_incremental_sync(stub, catalog):
+    """
+    La synchronisation incrémentale s'arrête à la dernière mise à jour déjà connue.
+    """
+    run(CatalogSync(catalog).full_sync)
+    stub.plugins[5] = dict(make_plugin(5, '2023-02-01 5:12pm GMT'), version='2.0')
+    stub.plugins.append(make_plugin(60, '2023-02-02 5:12pm GMT'))
+    stub.requests.clear()
+
+    run(CatalogSync(catalog).incremental_sync)
+    assert catalog.count() == 61
+    assert catalog.get_plugin('plugin-5')['version'] == '2.0'
+    assert [request['request[page]'] for request in stub.requests] == ['1']
+
+    # Les plugins obtenus par une synchronisation incrémentale sont conservés par la synchronisation complète
+    run(CatalogSync(catalog).full_sync)
+    assert catalog.count() == 61
+
+
+@pytest.mark.parametrize('error', ['http', 'sqlite'])
+def test_sync_errors_are_logged(stub, catalog, caplog, monkeypatch, error):
+    """
+    Une erreur de synchronisation, de wordpress.org ou de SQLite, est journalisée sans arrêter la job.
+    """
+    if error == 'http':
+        stub.failing_pages.add(1)
+    else:
+        def locked(*_):
+            raise sqlite3.OperationalError('database is locked')
+        monkeypatch.setattr(catalog, 'get_state', locked)
+    sync = CatalogSync(catalog)
+    sync.interval = 3600
+
+    async def main():
+        async with httpx.AsyncClient() as client:
+            sync.start(client)
+            await asyncio.sleep(0.2)
+            assert not sync._task.done()  # pylint: disable=protected-access
+            await sync.stop()
+
+    asyncio.run(main())
+    assert 'Catalog synchronization failed' in caplog.text
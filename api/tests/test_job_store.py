@@ -0,0 +1,53 @@
+"""
+Tests : stockage des jobs (storage/job_store.py)
+"""
+
+import sqlite3
+
+from storage.job_store import JOB_COLUMNS, JobStore
+
+# Schéma des bases créées avant la mesure des ressources des jobs
+ADDED_COLUMNS = {column.split()[0] for column in JobStore.ADDED_COLUMNS['jobs']}
+OLD_SCHEMA = '\n'.join(line for line in JobStore.SCHEMA.splitlines()
+                       if line.strip().split(' ')[0] not in ADDED_COLUMNS)
+
+
+def test_save_and_get(tmp_path):
+    """
+    Une job enregistrée est relue avec toutes ses colonnes.
+    """
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    job = {column: None for column in JOB_COLUMNS}
+    job.update(slug='akismet', state='FINISHED', submitted_at=1.0, cpu_seconds=2.5, max_rss=1024)
+    store.save(job)
+    assert store.get_jobs() == [job]
+
+
+def test_migrates_existing_database(tmp_path):
+    """
+    Les colonnes ajoutées depuis sont ajoutées à une base existante, sans perdre ses jobs.
+    """
+    path = str(tmp_path / 'jobs.sqlite3')
+    with sqlite3.connect(path) as connection:
+        connection.executescript(OLD_SCHEMA)
+        connection.execute('INSERT INTO jobs (slug, state, submitted_at, updated_at)'
+                           " VALUES ('akismet', 'FINISHED', 1, 1)")
+
+    store = JobStore(path)
+    assert [(job['slug'], job['cpu_seconds']) for job in store.get_jobs()] == [('akismet', None)]
+    store.save({'slug': 'hello-dolly', 'state': 'FINISHED', 'submitted_at': 2.0, 'write_bytes': 10})
+    assert store.get_jobs()[1]['write_bytes'] == 10
+
+    JobStore(path)  # Idempotent
+
+
+def test_delete_finished(tmp_path):
+    """
+    Seules les jobs terminées soumises avant la date donnée sont supprimées.
+    """
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    for slug, state, submitted_at in (('old', 'FINISHED', 1.0), ('failed', 'FAILED', 1.0), ('running', 'FUZZING', 1.0),
+                                      ('recent', 'FINISHED', 3.0)):
+        store.save({'slug': slug, 'state': state, 'submitted_at': submitted_at})
+    assert store.delete_finished(2.0) == 2
+    assert [job['slug'] for job in store.get_jobs()] == ['running', 'recent']
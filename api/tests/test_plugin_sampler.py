@@ -0,0 +1,67 @@
+"""
+Tests : échantillonnage aléatoire des plugins (storage/plugin_sampler.py)
+"""
+
+from collections import Counter
+
+from storage.plugin_sampler import PluginSampler, get_stratum
+
+
+def make_sampler(sizes: dict) -> PluginSampler:
+    """
+    Crée un sampler avec le nombre de plugins donné par strate.
+    """
+    sampler = PluginSampler()
+    for stratum, size in sizes.items():
+        for i in range(size):
+            sampler.add(f'plugin-{stratum}-{i}', 10 ** stratum)
+    return sampler
+
+
+def count_strata(slugs) -> Counter:
+    """
+    Compte les slugs par strate.
+    """
+    return Counter(int(slug.split('-')[1]) for slug in slugs)
+
+
+def test_get_stratum():
+    """
+    La strate est l'ordre de grandeur du nombre d'installations actives.
+    """
+    assert [get_stratum(value) for value in (0, 9, 10, 99, 100, 1000000)] == [0, 0, 1, 1, 2, 6]
+
+
+def test_stratified_equal_shares():
+    """
+    Chaque strate obtient sa part égale, et le reste est donné à des strates différentes d'un tirage à l'autre.
+    """
+    sampler = make_sampler({1: 50, 2: 60, 3: 70})
+    extras = Counter()
+    for _ in range(300):
+        counts = count_strata(sampler.sample(10, stratified=True))
+        assert sorted(counts.values()) == [3, 3, 4]
+        extras.update(stratum for stratum, count in counts.items() if count == 4)
+    assert set(extras) == {1, 2, 3}
+
+
+def test_stratified_small_strata():
+    """
+    Les strates trop petites sont prises en entier, et les autres se partagent le reste.
+    """
+    sampler = make_sampler({0: 1, 1: 2, 2: 100, 3: 100})
+    samples = sampler.sample(20, stratified=True)
+    assert len(set(samples)) == 20
+    counts = count_strata(samples)
+    assert (counts[0], counts[1], counts[2] + counts[3]) == (1, 2, 17)
+    assert sorted((counts[2], counts[3])) == [8, 9]
+
+
+def test_sample_bounded_by_catalog():
+    """
+    L'échantillon est borné par la taille du catalogue, avec ou sans stratification.
+    """
+    sampler = make_sampler({0: 3, 4: 2})
+    assert sorted(sampler.sample(10)) == sorted(sampler.sample(10, stratified=True))
+    assert len(sampler.sample(10)) == 5
+    assert not PluginSampler().sample(1, stratified=True)
@@ -0,0 +1,64 @@
+"""
+Tests : extraction des marqueurs du fuzzer (replacements/print_findings.py)
+"""
+
+import binascii
+import json
+import random
+import re
+
+import pytest
+
+print_findings = pytest.importorskip('print_findings')
+
+INTERCEPT = '__GARLIC_INTERCEPT__' + json.dumps({'name': '_GET', 'key': 'id', 'payload': 'x'}) + '__ENDGARLIC__'
+EQUAL = '__GARLIC_COULD_AS_WELL_BE_EQUAL__' + binascii.hexlify(b'a').decode() + ',' + \
+    binascii.hexlify(b'b').decode() + '__ENDGARLIC__'
+CALL = '__GARLIC_CALL__{"name": "system"}__ENDGARLIC__'
+HEADER = '__GARLIC_HEADER__' + binascii.hexlify(b'Location: x').decode() + '__ENDGARLIC__'
+NOT_IMPLEMENTED = '__GARLIC_NOT_IMPLEMENTED__f__ENDGARLIC__'
+PARTS = [INTERCEPT, EQUAL, CALL, HEADER, NOT_IMPLEMENTED, '__GARLIC_CALL__', '__GARLIC_NOT_IMPLEMENTED__',
+         '__ENDGARLIC__', 'text ', '\n', 'é']
+
+
+def test_markers_are_stripped():
+    """
+    Chaque marqueur est extrait et retiré de la sortie.
+    """
+    output, intercepts, calls, headers = print_findings.tokenize_markers(
+        'a' + INTERCEPT + 'b' + EQUAL + CALL + NOT_IMPLEMENTED + HEADER + 'c')
+    assert output == 'abc'
+    assert intercepts == ['_GET[id] = x', 'May as well be equal: a and b']
+    assert calls == ['{"name": "system"}']
+    assert headers == [binascii.hexlify(b'Location: x').decode()]
+
+
+def test_nested_markers():
+    """
+    Un marqueur dans un autre est extrait comme par des recherches séparées : l'intercept est compté, puis retiré
+    avant l'appel, qui n'a alors plus de fin.
+    """
+    output, intercepts, calls, _ = print_findings.tokenize_markers('a__GARLIC_CALL__f(' + INTERCEPT + ')b')
+    assert output == 'a__GARLIC_CALL__f()b'
+    assert intercepts == ['_GET[id] = x']
+    assert calls == ['f(' + INTERCEPT[:-len('__ENDGARLIC__')]]
+
+
+def test_same_result_as_separate_scans():
+    """
+    Le résultat est celui des recherches séparées, que les marqueurs se chevauchent ou non.
+    """
+    generator = random.Random(0)
+    for _ in range(2000):
+        output = ''.join(generator.choice(PARTS) for _ in range(generator.randint(0, 12)))
+        assert print_findings.tokenize_markers(output) == print_findings.tokenize_markers_separately(output), output
+
+
+def test_literal_prefix():
+    """
+    Le préfixe commun n'est factorisé que s'il est littéral, sans le caractère auquel s'applique un quantificateur.
+    """
+    assert print_findings.MARKERS_PREFIX == '__GARLIC_'
+    assert print_findings.literal_prefix([re.compile('abc*d'), re.compile('abcx')]) == 'ab'
+    assert print_findings.literal_prefix([re.compile('a.c'), re.compile('a.d')]) == 'a'
+    assert print_findings.literal_prefix([re.compile('abc', re.IGNORECASE), re.compile('abd')]) == ''
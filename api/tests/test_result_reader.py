@@ -0,0 +1,67 @@
+"""
+Tests : lecture incrémentale des résultats du fuzzer (replacements/result_reader.py)
+"""
+
+import io
+import json
+
+import pytest
+
+import result_reader  # pylint: disable=import-error
+
+DOCUMENT = {
+    'active_installs': 1.5,
+    'rating': -2.25e-3,
+    'version': '1.0',
+    'downloads': 120000,
+    'ratio': 3E+2,
+    'flags': [True, False, None, 0, -1, 10.0],
+    'command_results': [
+        {'output': 'a\nb', 'stdout': None, 'stderr': 'é', 'exit_code': 0, 'duration': 0.125},
+        {'output': '', 'stdout': 'x', 'stderr': '', 'exit_code': -11, 'duration': 1e-05}
+    ],
+    'score': 42
+}
+
+
+def read(text: str) -> dict:
+    """
+    Lit un fichier de résultats en entier, en consommant les commandes.
+    """
+    return {key: list(value) if key == 'command_results' else value
+            for key, value in result_reader.iter_result_file(io.StringIO(text))}
+
+
+@pytest.mark.parametrize('separators', [(',', ':'), (', ', ': ')])
+def test_every_chunk_size(monkeypatch, separators):
+    """
+    Le résultat ne dépend pas de l'endroit où les chunks coupent le document, y compris au milieu d'un nombre.
+    """
+    text = json.dumps(DOCUMENT, separators=separators)
+    for chunk_size in range(1, len(text) + 1):
+        monkeypatch.setattr(result_reader, 'CHUNK_SIZE', chunk_size)
+        assert read(text) == DOCUMENT, chunk_size
+
+
+def test_number_split_in_fraction(monkeypatch):
+    """
+    Un chunk se terminant par "1." ne doit pas être décodé comme le nombre 1.
+    """
+    text = '{"active_installs": 1.5, "score": 2}'
+    monkeypatch.setattr(result_reader, 'CHUNK_SIZE', 22)
+    assert read(text) == {'active_installs': 1.5, 'score': 2}
+
+
+def test_empty_file():
+    """
+    Un fichier vide ne contient aucune clé.
+    """
+    assert read('') == {}
+
+
+def test_invalid_number():
+    """
+    Un nombre invalide est une erreur, même en fin de document.
+    """
+    with pytest.raises(json.JSONDecodeError):
+        read('{"score": 1.}')
@@ -9,7 +9,7 @@ rm -r test
 
 # Move replacement files
 cd ..
-mv ./replacements/print_findings.py ./wpgarlic/
+mv ./replacements/*.py ./wpgarlic/
 rm -r replacements
 
 # Create required structure
@@ -17,6 +17,7 @@ from app.errors import register_error_handlers
 
 from app.ext.sentry import init_sentry
 from app.ext.cache import cache
+from app.ext.api import api
 
 from app.commands import init_app_cli
 
@@ -55,6 +56,7 @@ def create_app() -> Flask:
         init_database(app)
 
     cache.init_app(app)
+    api.init_app(app)
     register_jinja_mapping(app)
 
     # automatically enabled when DEBUG_TB_ENABLED=True
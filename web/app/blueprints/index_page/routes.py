@@ -1,8 +1,8 @@
 """
 Routes liées à la page d'accueil
 """
-from flask import Blueprint, make_response, render_template, Response
-from app.blueprints.index_page.views.index import get_plugins
+from flask import Blueprint, make_response, render_template, request, Response
+from app.blueprints.index_page.views.index import fuzz_plugin, search_plugins
 
 blueprint: Blueprint = Blueprint(
     'index',
@@ -18,20 +18,35 @@ def index_route() -> Response:
     Display the index page with the list of plugins
     :return: Index page with plugins
     """
-    plugins = get_plugins()
+    query = request.args.get('q', '', type=str)
+    page = request.args.get('page', 1, type=int)
+    plugins, total, page, pages = search_plugins(query, page)
     return make_response(
         render_template(
             "index.jinja2",
-            plugins=plugins
+            plugins=plugins,
+            query=query,
+            page=page,
+            pages=pages,
+            total=total
         )
     )
 
 
-# pylint: disable=unused-argument, unnecessary-pass
-@blueprint.route("/fuzz-plugin/<slug>", methods=["get"])
+@blueprint.route("/fuzz-plugin/<slug>", methods=["post"])
 def fuzz_plugin_route(slug) -> Response:
     """
-    Fuzz a plugin (the function does nothing because it needs to be implemented with the API)
+    Fuzz a plugin, through the API
     :param slug: Plugin slug
+    :return: Page with the response of the API
     """
-    pass
+    status_code, data = fuzz_plugin(slug)
+    return make_response(
+        render_template(
+            "fuzz.jinja2",
+            slug=slug,
+            success=status_code == 202,
+            message=data.get('message') or data.get('detail')
+        ),
+        status_code
+    )
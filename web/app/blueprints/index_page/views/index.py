@@ -1,20 +1,122 @@
 """
-Module for getting the list of plugins from the WordPress API
+Module for getting the list of plugins from the WPGarlic API
 """
+import logging
+import math
+import time
+from threading import Thread
+from typing import List, Tuple
+
 import requests
+from flask import Flask, current_app
+
+from app.ext.api import api
+from app.ext.cache import cache
+
+logger = logging.getLogger(__name__)
+
+PLUGINS_CACHE_KEY = 'index.plugins'
+REFRESH_LOCK_KEY = 'index.plugins.refresh'
+
+
+def fetch_plugins() -> List[dict]:
+    """
+    Get the list of the most popular plugins from the API, which serves them from its local catalog
+    :return: List of plugins
+    """
+    r = api.get('/wordpress/plugins', params={'browse': 'popular', 'page': 1})
+    r.raise_for_status()
+
+    return r.json()['data']
+
+
+def fuzz_plugin(slug: str) -> Tuple[int, dict]:
+    """
+    Submit a plugin to the fuzzer through the API
+    :param slug: Plugin slug
+    :return: Status code and JSON response of the API, or 502 and an error message if the API could not be reached or
+    did not respond with JSON
+    """
+    try:
+        r = api.post(f'/fuzz_plugin/{slug}')
+    except requests.RequestException as ex:
+        logger.warning('Unable to submit %s to the API: %s', slug, ex)
+        return 502, {'detail': 'The fuzzer API could not be reached, please try again later.'}
+    try:
+        return r.status_code, r.json()
+    except ValueError:
+        logger.warning('Unexpected response of the API for %s: %s %s', slug, r.status_code, r.text[:200])
+        return 502, {'detail': f'The fuzzer API responded with an unexpected error ({r.status_code}).'}
 
 
-def get_plugins():
+def refresh_plugins(app: Flask) -> List[dict]:
     """
-    Get the list of plugins from the WordPress API
+    Fetch the list of plugins and store it in the shared cache, with the time it was fetched
+    :param app: Flask application, the refresh may run outside of a request
     :return: List of plugins
     """
-    base_url = 'https://api.wordpress.org/plugins/info/1.1/'
-    r = requests.get(
-        base_url +
-        '?action=query_plugins&request[page]=1&request[per_page]=250&request[browse]=popular',
-        timeout=30)
+    with app.app_context():
+        plugins = fetch_plugins()
+        # The entry never expires: a stale list is still served while it is being refreshed
+        cache.set(PLUGINS_CACHE_KEY, {'plugins': plugins, 'fetched_at': time.time()}, timeout=0)
+        return plugins
 
-    results = [plugin for plugin in r.json()['plugins']]
 
-    return results
+def refresh_plugins_in_background() -> None:
+    """
+    Refresh the list of plugins in a background thread, unless another process or thread is already refreshing it
+    """
+    # add() is the only step of the lock: FileSystemCache keeps expired entries on disk and add() only checks if
+    # the entry exists, so the key changes every lock timeout, and a lock left by a killed process is not reused
+    lock_timeout = current_app.config['PLUGINS_REFRESH_LOCK_TIMEOUT']
+    lock_key = f'{REFRESH_LOCK_KEY}.{int(time.time() // lock_timeout)}'
+    if not cache.add(lock_key, True, timeout=lock_timeout):
+        return
+
+    def refresh(app: Flask):
+        try:
+            refresh_plugins(app)
+        except (requests.RequestException, ValueError, KeyError) as ex:
+            logger.warning('Unable to refresh the list of plugins: %s', ex)
+        finally:
+            with app.app_context():
+                cache.delete(lock_key)
+
+    # pylint: disable=protected-access
+    Thread(target=refresh, args=(current_app._get_current_object(),), daemon=True).start()
+
+
+def get_plugins() -> List[dict]:
+    """
+    Get the list of plugins from the shared cache (stale-while-revalidate).
+    Only the very first load waits on wordpress.org, the next ones are refreshed in the background once stale.
+    :return: List of plugins
+    """
+    entry = cache.get(PLUGINS_CACHE_KEY)
+    if entry is None:
+        # pylint: disable=protected-access
+        return refresh_plugins(current_app._get_current_object())
+    if time.time() - entry['fetched_at'] > current_app.config['PLUGINS_CACHE_MAX_AGE']:
+        refresh_plugins_in_background()
+    return entry['plugins']
+
+
+def search_plugins(query: str = '', page: int = 1) -> Tuple[List[dict], int, int, int]:
+    """
+    Get a page of plugins, filtered by a search on their slug, name and description
+    :param query: Search terms, case-insensitive
+    :param page: Page number, starting from 1
+    :return: Plugins of the page, total number of matching plugins, page number (bounded) and number of pages
+    """
+    plugins = get_plugins()
+    terms = query.lower().split()
+    if terms:
+        plugins = [plugin for plugin in plugins
+                   if all(term in ' '.join((plugin.get('slug', ''), plugin.get('name', ''),
+                                            plugin.get('short_description', ''))).lower()
+                          for term in terms)]
+
+    per_page = current_app.config['PLUGINS_PER_PAGE']
+    pages = max(1, math.ceil(len(plugins) / per_page))
+    page = min(max(1, page), pages)
+    return plugins[(page - 1) * per_page:page * per_page], len(plugins), page, pages
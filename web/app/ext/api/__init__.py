@@ -0,0 +1,47 @@
+"""
+Client de l'API WPGarlic (service "api" du docker-compose)
+"""
+
+import requests
+from flask import Flask
+from requests.adapters import HTTPAdapter
+
+
+class ApiClient:
+    """
+    Client HTTP vers l'API, partagé par toutes les requêtes d'un processus.
+    Les connexions sont conservées dans un pool (keep-alive), plutôt qu'ouvertes à chaque appel.
+    """
+
+    def __init__(self):
+        self.base_url: str = ''
+        self.timeout: float = 30
+        self.session: requests.Session = requests.Session()
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Initialise le client à partir de la configuration (API_URL, API_TIMEOUT et API_POOL_SIZE).
+        :param app: Application Flask
+        """
+        self.base_url = app.config.get("API_URL").rstrip('/')
+        self.timeout = app.config.get("API_TIMEOUT")
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=app.config.get("API_POOL_SIZE"))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        """
+        Envoie une requête GET à l'API.
+        :param path: Chemin de la route, par exemple /wordpress/plugins
+        """
+        return self.session.get(self.base_url + path, timeout=self.timeout, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        """
+        Envoie une requête POST à l'API.
+        :param path: Chemin de la route, par exemple /fuzz_plugin/akismet
+        """
+        return self.session.post(self.base_url + path, timeout=self.timeout, **kwargs)
+
+
+api: ApiClient = ApiClient()
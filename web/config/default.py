@@ -7,7 +7,15 @@ IS_PRODUCTION = False
 FLASK_STRICT_SLASHES = False
 
 # https://flask-caching.readthedocs.io/en/latest/
-CACHE_TYPE = "NullCache"
+# The file system cache is shared by all the uWSGI processes (webservice.ini)
+CACHE_TYPE = "FileSystemCache"
+CACHE_DIR = "/tmp/projet-fuzzer-cache"
+CACHE_DEFAULT_TIMEOUT = 300
+
+# WPGarlic API, reached through the internal docker-compose network
+API_URL = "http://api:8000"
+API_TIMEOUT = 30
+API_POOL_SIZE = 10
 
 # SQLAlchemy
 SQLALCHEMY_AUTOCOMMIT = False
@@ -47,3 +55,8 @@ BLUEPRINTS_VIEW_STYLES = BLUEPRINTS_VIEW_STYLES + [
 BLUEPRINTS_BOILERPLATE_CUSTOM_VARS = {
     "version": "0.1"
 }
+
+# Index page: the list of plugins is refreshed in the background once older than PLUGINS_CACHE_MAX_AGE (seconds)
+PLUGINS_CACHE_MAX_AGE = 600
+PLUGINS_REFRESH_LOCK_TIMEOUT = 60
+PLUGINS_PER_PAGE = 25